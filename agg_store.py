@@ -0,0 +1,142 @@
+import datetime
+import os
+import sqlite3
+from contextlib import closing
+
+import pandas as pd
+
+from engine import CLEAN_COLUMNS, MATCH_KEYS, partial_sums, read_bytes
+from parse_cache import cache_key
+from trend import file_date, source_name
+
+# ==========================================
+# 增量汇总库: 每个销售 / 广告文件按匹配键汇总后的部分和只入库一次 (SQLite)
+# 以文件内容哈希去重；生成报表时合并库中部分和 + 新上传文件，无需重新解析历史文件
+# 文件名含日期时，同一日期 + 同一来源 (trend.source_name) 的新文件替换旧文件 (与趋势数据相同)，
+# 重新上传更正后的导出不会与原文件重复累加
+# ==========================================
+
+STORE_KINDS = ('sales', 'ads')
+
+DEFAULT_STORE_PATH = os.environ.get('COUPANG_STORE_PATH', os.path.join(os.path.expanduser('~'), '.local', 'share', 'coupang_report', 'aggregates.sqlite'))
+
+def _table(kind):
+    return f"partials_{kind}"
+
+def _quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+# 文件所属月份 (YYYY-MM): 文件名中的日期优先 (如 sales_2024-05-01.xlsx)，否则为入库日期
+def file_month(name, added_at):
+    date = file_date(name or '')
+    return f"{date:%Y-%m}" if date is not None else str(added_at)[:7]
+
+class AggregateStore:
+    def __init__(self, path=DEFAULT_STORE_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with closing(self._connect()) as conn, conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS files (file_hash TEXT PRIMARY KEY, kind TEXT NOT NULL, name TEXT, n_keys INTEGER, added_at TEXT)")
+            for kind in STORE_KINDS:
+                key, *values = CLEAN_COLUMNS[kind]
+                cols = ', '.join([f"{_quote(key)} TEXT"] + [f"{_quote(v)} REAL" for v in values])
+                conn.execute(f"CREATE TABLE IF NOT EXISTS {_table(kind)} (file_hash TEXT NOT NULL, {cols})")
+                conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{_table(kind)} ON {_table(kind)} (file_hash)")
+
+    # 每次操作单独连接 (Streamlit 多线程下不共享连接)
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    # 文件哈希 (与解析缓存相同: 内容 + 类型 + 列号配置，清洗逻辑变化时自动失效)
+    @staticmethod
+    def file_hash(file, kind):
+        return cache_key(read_bytes(file), kind)
+
+    # 已入库的哈希集合
+    def known(self, hashes):
+        hashes = list(hashes)
+        if not hashes:
+            return set()
+        with closing(self._connect()) as conn:
+            rows = conn.execute(f"SELECT file_hash FROM files WHERE file_hash IN ({','.join('?' * len(hashes))})", hashes).fetchall()
+        return {h for (h,) in rows}
+
+    # 拆分上传文件: 返回 (去重后的全部哈希, 尚未入库的 [(哈希, 文件)])
+    def split(self, files, kind):
+        hashes, new = [], []
+        for file in files or []:
+            h = self.file_hash(file, kind)
+            if h in hashes: continue
+            hashes.append(h)
+            new.append((h, file))
+        known = self.known(hashes)
+        return hashes, [(h, f) for h, f in new if h not in known]
+
+    # 同类型中与 name 同日期 + 同来源的已入库文件哈希 (文件名无日期时不替换: 每天同名上传的文件各自保留)
+    def superseded(self, kind, name):
+        date = file_date(name or '')
+        if date is None:
+            return []
+        source = source_name(name)
+        files = self.files(kind)
+        return [h for h, n in zip(files['file_hash'], files['name']) if file_date(n or '') == date and source_name(n or '') == source]
+
+    # 入库一个文件的清洗结果 (先按匹配键汇总)；已存在则跳过，同日期 + 同来源的旧文件被替换
+    def add(self, file_hash, kind, name, clean):
+        part = partial_sums(clean, kind)
+        cols = CLEAN_COLUMNS[kind]
+        rows = zip([file_hash] * len(part), *[part[c].tolist() for c in cols])
+        added_at = datetime.datetime.now().isoformat(timespec='seconds')
+        old = [h for h in self.superseded(kind, name) if h != file_hash]
+        with closing(self._connect()) as conn, conn:
+            cur = conn.execute("INSERT OR IGNORE INTO files VALUES (?, ?, ?, ?, ?)", (file_hash, kind, name, len(part), added_at))
+            if cur.rowcount:
+                conn.executemany(f"INSERT INTO {_table(kind)} VALUES ({','.join('?' * (len(cols) + 1))})", rows)
+                self._delete(conn, old)
+
+    # 合并若干已入库文件的部分和，返回与清洗结果同列的 DataFrame (每个键一行)
+    def load(self, hashes, kind):
+        hashes = list(dict.fromkeys(hashes))
+        cols = CLEAN_COLUMNS[kind]
+        if not hashes:
+            return partial_sums(None, kind)
+        with closing(self._connect()) as conn:
+            df = pd.read_sql_query(
+                f"SELECT {', '.join(_quote(c) for c in cols)} FROM {_table(kind)} WHERE file_hash IN ({','.join('?' * len(hashes))})",
+                conn, params=hashes,
+            )
+        df[MATCH_KEYS[kind]] = df[MATCH_KEYS[kind]].astype(object)
+        for col in cols[1:]:
+            df[col] = df[col].astype(float)
+        return partial_sums(df, kind)
+
+    # 已入库文件清单 (按入库时间排序)，month 列为所属月份
+    def files(self, kind=None):
+        query = "SELECT file_hash, kind, name, n_keys, added_at FROM files"
+        params = []
+        if kind is not None:
+            query += " WHERE kind = ?"
+            params.append(kind)
+        with closing(self._connect()) as conn:
+            df = pd.read_sql_query(query + " ORDER BY added_at, name", conn, params=params)
+        df['month'] = [file_month(name, added_at) for name, added_at in zip(df['name'], df['added_at'])]
+        return df
+
+    @staticmethod
+    def _delete(conn, hashes):
+        if not hashes:
+            return
+        marks = ','.join('?' * len(hashes))
+        for kind in STORE_KINDS:
+            conn.execute(f"DELETE FROM {_table(kind)} WHERE file_hash IN ({marks})", hashes)
+        conn.execute(f"DELETE FROM files WHERE file_hash IN ({marks})", hashes)
+
+    def remove(self, hashes):
+        hashes = list(hashes)
+        if not hashes:
+            return
+        with closing(self._connect()) as conn, conn:
+            self._delete(conn, hashes)
+
+    def clear(self):
+        self.remove(self.files()['file_hash'].tolist())
@@ -1,8 +1,18 @@
+import datetime
+
 import streamlit as st
 import pandas as pd
-import io
-import re
-import requests  # 新增：用于网络请求
+
+from agg_store import AggregateStore
+from batch import shop_reports_zip
+from engine import PROFIT_OPTIONS, ProductIndex, available_backends, compute_report, filter_sheets, parse_query
+from export import excel_bytes, export_bundle
+from fx_rate import STATUS_LIVE, STATUS_STORED, RateProvider, source_from_env
+from ingest import load_inputs
+from instrument import StageRecorder, stage
+from parse_cache import ParseCache
+from trend import PERIOD_OPTIONS, FactStore, daily_facts, ingest_facts, inventory_by_code, period_compare, rolling_trend
+from view import PAGE_SIZES, bar_ranges, page_count, page_slice, search_rows, sort_rows, style_inventory_page, style_report_page, zebra_flags
 
 # ==========================================
 # 1. 页面配置 (宽屏)
@@ -10,86 +20,105 @@ import requests  # 新增：用于网络请求
 st.set_page_config(layout="wide", page_title="Coupang 经营看板 Pro (最终版)")
 st.title("📊 Coupang 经营分析看板 (最终版·自动汇率)")
 
-# --- 列号配置 ---
-IDX_M_CODE   = 0    # A列
-IDX_M_SHOP   = 1    # B列: 登品店铺
-IDX_M_SKU    = 3    # D列
-IDX_M_COST   = 6    # G列
-IDX_M_PROFIT = 10   # K列
-IDX_M_BAR    = 12   # M列
-
-IDX_S_ID     = 0    # A列
-IDX_S_QTY    = 8    # I列
-
-IDX_A_CAMPAIGN = 5  # F列
-IDX_A_GROUP    = 6  # G列
-IDX_A_SPEND    = 15 # P列
-IDX_A_SALES    = 29 # AD列
-
-IDX_I_R_ID   = 2    # C列
-IDX_I_R_QTY  = 7    # H列
-
-IDX_I_J_BAR  = 2    # C列
-IDX_I_J_QTY  = 10   # K列
-
 # ==========================================
 # 2. 核心功能函数
 # ==========================================
 
-# 【新增】自动获取实时汇率 (带缓存，1小时刷新一次)
-@st.cache_data(ttl=3600)
-def get_live_exchange_rate():
-    try:
-        # 使用免费公开 API (Base: KRW)
-        url = "https://api.exchangerate-api.com/v4/latest/KRW"
-        response = requests.get(url, timeout=3)
-        if response.status_code == 200:
-            data = response.json()
-            rate = data['rates'].get('CNY')
-            if rate:
-                return rate, True # 返回汇率, 成功标志
-    except:
-        pass
-    return 0.0048, False # 失败则返回默认值
-
-# 清洗匹配键
-def clean_for_match(series):
-    return series.astype(str).str.replace(r'\.0$', '', regex=True).str.replace('"', '').str.strip().str.upper()
-
-# 清洗数字
-def clean_num(series):
-    return pd.to_numeric(series.astype(str).str.replace(',', ''), errors='coerce').fillna(0)
-
-# 提取编号
-def extract_code_from_text(text):
-    if pd.isna(text): return None
-    match = re.search(r'([Cc]\d+)', str(text))
-    if match: return match.group(1).upper()
-    return None
-
-# 读取文件
-def read_file_strict(file):
-    try:
-        file.seek(0)
-        if file.name.endswith('.csv'):
-            return pd.read_csv(file, dtype=str)
-        else:
-            return pd.read_excel(file, dtype=str, engine='openpyxl')
-    except:
-        file.seek(0)
-        return pd.read_csv(file, dtype=str, encoding='gbk')
+# 汇率: 后台获取 (1小时刷新一次)，最近一次成功的汇率保存在本地，页面加载不等待网络
+@st.cache_resource
+def get_rate_provider():
+    return RateProvider(source=source_from_env())
+
+# 下载格式: 显示名 -> (扩展名, MIME, 生成函数, 是否按店铺拆分)
+# 按店铺拆分的生成函数接收未筛选的报表与筛选条件 (每个店铺单独筛选 / 编号)，其余接收筛选后的三张报表
+EXPORT_FORMATS = {
+    "Excel": ("xlsx", "application/vnd.ms-excel", excel_bytes, False),
+    "按店铺 Excel 压缩包": ("zip", "application/zip", shop_reports_zip, True),
+    "CSV 压缩包": ("zip", "application/zip", lambda *sheets: export_bundle(*sheets, fmt='csv'), False),
+    "Parquet 压缩包": ("zip", "application/zip", lambda *sheets: export_bundle(*sheets, fmt='parquet'), False),
+}
+
+# 本次运行 (页面重跑) 的筛选 / 渲染阶段计时；计算阶段的计时保存在 session_state['timings']
+render_recorder = StageRecorder()
+
+# 导出计时: 下载时才调用 (make_data 无参数)，计时写入 log (列表) 供调试面板显示
+def timed_export(make_data, log):
+    recorder = StageRecorder()
+    with recorder.activate():
+        data = make_data()
+    log[:] = recorder.records
+    return data
+
+# 解析缓存 (同一文件只解析一次，跨会话共享)
+@st.cache_resource
+def get_parse_cache():
+    return ParseCache()
+
+# 分页表格: 搜索 / 排序在完整结果上执行，只把当前页 (含样式) 发送到浏览器
+# style_page(page_df, zebra, view) 返回当前页的 Styler；group_col 为斑马纹分组列
+def render_paged(df, key, style_page, group_col):
+    c1, c2, c3, c4 = st.columns([3, 2, 1, 1])
+    search = c1.text_input("🔎 表内搜索", key=f"{key}_search", placeholder="编号 / SKU / 条码 / 名称...")
+    sort_col = c2.selectbox("排序列", [None, *df.columns], key=f"{key}_sort", format_func=lambda c: "默认顺序" if c is None else str(c))
+    descending = c3.toggle("降序", key=f"{key}_desc")
+    page_size = c4.selectbox("每页行数", PAGE_SIZES, index=1, key=f"{key}_size")
+
+    view = sort_rows(search_rows(df, search), sort_col, ascending=not descending)
+    n_pages = page_count(len(view), page_size)
+    page_key = f"{key}_page"
+    if st.session_state.get(page_key, 1) > n_pages:
+        st.session_state[page_key] = n_pages
+
+    zebra = zebra_flags(view.iloc[:, group_col]) if len(view) else []
+    page = st.session_state.get(page_key, 1)
+    start = (page - 1) * page_size
+    page_df = page_slice(view, page, page_size)
+    with render_recorder.activate(), stage(f"render:{key}", rows=len(page_df)):
+        st.dataframe(style_page(page_df, zebra[start:start + page_size], view), use_container_width=True, height=table_height, hide_index=True)
+
+    p1, p2 = st.columns([1, 5])
+    p1.number_input("页码", min_value=1, max_value=n_pages, step=1, key=page_key, label_visibility="collapsed")
+    p2.caption(f"第 {page} / {n_pages} 页 · 共 {len(view):,} 行 (全部 {len(df):,} 行)")
+
+# 增量汇总库 (已入库的销售 / 广告文件不再解析)
+@st.cache_resource
+def get_aggregate_store():
+    return AggregateStore()
+
+# 按日期入库的每日事实表 (趋势分析)
+@st.cache_resource
+def get_fact_store():
+    return FactStore()
+
+# 上传文件的内容哈希 (按 file_id 记忆，避免每次重跑都重新计算)
+def uploaded_hashes(files, kind):
+    memo = st.session_state.setdefault('file_hashes', {})
+    hashes = []
+    for f in files or []:
+        k = (getattr(f, 'file_id', f.name), kind)
+        if k not in memo:
+            memo[k] = AggregateStore.file_hash(f, kind)
+        hashes.append(memo[k])
+    return hashes
+
+ALL_MONTHS = "全部月份"
+
+# 已入库文件的显示名
+def stored_label(files, file_hash):
+    row = files.loc[files['file_hash'] == file_hash].iloc[0]
+    return f"{row['name']} ({row['added_at'][:10]})"
 
 # ==========================================
 # 3. 侧边栏设置
 # ==========================================
 with st.sidebar:
     st.header("🔍 数据筛选")
-    filter_code = st.text_input("输入产品编号 (如 C123)", placeholder="留空则显示全部...").strip().upper()
+    filter_code = st.text_input("产品编号 / SKU / 条码 / 店铺 (如 C123)", placeholder="留空则显示全部，多个用逗号或空格分隔...").strip().upper()
     
     st.write("") 
     filter_profit = st.radio(
         "💰 利润筛选 (最终净利润)",
-        ("全部显示", "只看盈利 (>0)", "只看亏损 (<0)"),
+        PROFIT_OPTIONS,
         index=0
     )
     
@@ -98,29 +127,36 @@ with st.sidebar:
     # --- 自动汇率逻辑 ---
     st.header("💱 汇率设置")
     
-    # 获取实时汇率
-    live_rate_val, is_live = get_live_exchange_rate()
+    # 获取汇率 (立即返回，过期时后台更新)
+    rate_info = get_rate_provider().get()
+    live_rate_val = rate_info.rate
     
-    # 汇率输入框 (默认值为获取到的实时汇率)
+    # 汇率输入框: 初始值为获取到的汇率；后台更新出新汇率时只在用户未手动修改时跟随，手动输入的汇率保持不变
+    if st.session_state.get('fx_rate_input') in (None, st.session_state.get('fx_rate_seed')):
+        st.session_state['fx_rate_input'] = float(live_rate_val)
+        st.session_state['fx_rate_seed'] = float(live_rate_val)
     exchange_rate = st.number_input(
         "韩币 -> 人民币 (KRW/CNY)", 
         min_value=0.0001, 
         max_value=0.1000, 
-        value=float(live_rate_val), 
         step=0.0001,
-        format="%.4f"
+        format="%.4f",
+        key='fx_rate_input'
     )
     
     # 状态提示
-    if is_live:
-        st.caption(f"🟢 已获取实时汇率 (API)")
+    if rate_info.status == STATUS_LIVE:
+        st.caption(f"🟢 已获取实时汇率 ({rate_info.fetched_at:%m-%d %H:%M} 更新)")
+    elif rate_info.status == STATUS_STORED:
+        st.caption(f"🟡 使用本地保存的汇率 ({rate_info.fetched_at:%Y-%m-%d %H:%M})，后台更新中")
     else:
-        st.caption(f"⚪ 网络超时，使用默认汇率")
+        st.caption(f"⚪ 尚未获取到汇率，使用默认汇率")
 
     st.divider()
     
     st.header("👁️ 视图设置")
     table_height = st.slider("表格显示高度 (像素)", 600, 3000, 1500, step=100)
+    debug_mode = st.checkbox("🐞 显示各阶段耗时 / 内存", value=False)
 
     st.divider()
     
@@ -132,6 +168,40 @@ with st.sidebar:
     files_ads = st.file_uploader("3. 广告表 (Ads) *必传", type=['csv', 'xlsx', 'xlsm'], accept_multiple_files=True)
     files_inv = st.file_uploader("4. 库存信息表 (火箭仓 Rocket)", type=['csv', 'xlsx', 'xlsm'], accept_multiple_files=True)
     files_inv_j = st.file_uploader("5. 库存信息表 (极风OMS)", type=['csv', 'xlsx', 'xlsm'], accept_multiple_files=True)
+    stream_mode = st.checkbox("🌊 流式汇总销售表/广告表 (超大文件省内存)", value=False)
+    # 计算引擎: 安装 duckdb 后可选 (汇总 + 关联作为一个多线程查询执行)
+    backend = st.selectbox("⚙️ 计算引擎", available_backends(), index=0)
+
+    # 增量汇总: 每天只需上传新文件，历史文件从汇总库中选择
+    trend_mode = st.checkbox("📅 按日期入库 (趋势分析，文件名需含日期如 2024-05-01)", value=False)
+    if trend_mode and st.button("🗑️ 清空趋势数据"):
+        get_fact_store().clear()
+        st.session_state.pop('trend', None)
+        st.rerun()
+    use_store = st.checkbox("📚 增量汇总 (销售表/广告表入库，历史文件无需重复上传)", value=False)
+    stored = {}
+    if use_store:
+        store = get_aggregate_store()
+        # 按月份合并: 默认只选当月 (文件名日期或入库日期)，跨月后上月文件不会自动计入
+        all_files = store.files()
+        current_month = datetime.date.today().strftime('%Y-%m')
+        months = [current_month] + sorted(set(all_files['month']) - {current_month}, reverse=True)
+        month = st.selectbox("汇总月份", months + [ALL_MONTHS], index=0)
+        for kind, label, uploaded in (('sales', "已入库销售表", files_sales), ('ads', "已入库广告表", files_ads)):
+            # 本次已上传的文件不在候选中 (避免重复计入)
+            files = all_files[all_files['kind'] == kind]
+            files = files[~files['file_hash'].isin(uploaded_hashes(uploaded, kind))]
+            if month != ALL_MONTHS:
+                files = files[files['month'] == month]
+            stored[kind] = st.multiselect(label, files['file_hash'].tolist(), default=files['file_hash'].tolist(),
+                                          format_func=lambda h, files=files: stored_label(files, h))
+        b1, b2 = st.columns(2)
+        if month != ALL_MONTHS and b1.button(f"🗑️ 删除 {month}"):
+            store.remove(all_files.loc[all_files['month'] == month, 'file_hash'])
+            st.rerun()
+        if b2.button("🗑️ 清空汇总库"):
+            store.clear()
+            st.rerun()
 
 # ==========================================
 # 4. 主逻辑
@@ -140,373 +210,137 @@ st.divider()
 
 missing_files = []
 if not file_master: missing_files.append("1.基础信息表")
-if not files_sales: missing_files.append("2.销售表")
-if not files_ads: missing_files.append("3.广告表")
+if not (files_sales or stored.get('sales')): missing_files.append("2.销售表")
+if not (files_ads or stored.get('ads')): missing_files.append("3.广告表")
 
 if missing_files:
     st.warning(f"👉 请在左侧上传必要文件后开始分析。当前缺失：{'、'.join(missing_files)}")
 else:
     btn_label = "🚀 开始生成报表"
-    filters_applied = []
-    if filter_code: filters_applied.append(f"编号:{filter_code}")
-    if filter_profit != "全部显示": filters_applied.append(f"{filter_profit}")
-    if filters_applied:
-        btn_label += f" (筛选: {' + '.join(filters_applied)})"
-    
+
+    # 输入文件签名: 文件不变时复用已计算结果，筛选条件变化只做快速过滤
+    input_key = tuple(
+        getattr(f, 'file_id', f.name)
+        for f in [file_master, *files_sales, *files_ads, *(files_inv or []), *(files_inv_j or [])]
+    )
+    input_key += (stream_mode, backend, use_store, tuple(stored.get('sales', [])), tuple(stored.get('ads', [])))
+
     if st.button(btn_label, type="primary", use_container_width=True):
         try:
-            with st.spinner("正在全速计算中..."):
-                # --- Step 1-5: 数据清洗与计算 ---
-                df_master = read_file_strict(file_master)
-                col_code_name = df_master.columns[IDX_M_CODE]
-
-                df_calc = df_master.copy()
-                df_calc['_MATCH_SKU'] = clean_for_match(df_calc.iloc[:, IDX_M_SKU])
-                df_calc['_MATCH_BAR'] = clean_for_match(df_calc.iloc[:, IDX_M_BAR])
-                df_calc['_MATCH_CODE'] = clean_for_match(df_calc.iloc[:, IDX_M_CODE])
-                df_calc['_VAL_PROFIT'] = clean_num(df_calc.iloc[:, IDX_M_PROFIT])
-                df_calc['_VAL_COST'] = clean_num(df_calc.iloc[:, IDX_M_COST])
-                df_calc['_MATCH_SHOP'] = df_calc.iloc[:, IDX_M_SHOP].astype(str).str.strip()
-
-                sales_list = [read_file_strict(f) for f in files_sales]
-                df_sales_all = pd.concat(sales_list, ignore_index=True)
-                df_sales_all['_MATCH_SKU'] = clean_for_match(df_sales_all.iloc[:, IDX_S_ID])
-                df_sales_all['销量'] = clean_num(df_sales_all.iloc[:, IDX_S_QTY])
-                sales_agg = df_sales_all.groupby('_MATCH_SKU')['销量'].sum().reset_index()
-                sales_agg.rename(columns={'销量': 'SKU销量'}, inplace=True) 
-
-                ads_list = [read_file_strict(f) for f in files_ads]
-                df_ads_all = pd.concat(ads_list, ignore_index=True)
-                df_ads_all['含税广告费'] = clean_num(df_ads_all.iloc[:, IDX_A_SPEND]) * 1.1
-                df_ads_all['广告销量'] = clean_num(df_ads_all.iloc[:, IDX_A_SALES])
-                df_ads_all['Code_Group'] = df_ads_all.iloc[:, IDX_A_GROUP].apply(extract_code_from_text)
-                df_ads_all['Code_Campaign'] = df_ads_all.iloc[:, IDX_A_CAMPAIGN].apply(extract_code_from_text)
-                df_ads_all['_MATCH_CODE'] = df_ads_all['Code_Group'].fillna(df_ads_all['Code_Campaign'])
-                valid_ads = df_ads_all.dropna(subset=['_MATCH_CODE'])
-                ads_agg = valid_ads.groupby('_MATCH_CODE')[['含税广告费', '广告销量']].sum().reset_index()
-                ads_agg.rename(columns={'含税广告费': 'R列_产品总广告费', '广告销量': '产品广告销量'}, inplace=True)
-
-                if files_inv:
-                    inv_list = [read_file_strict(f) for f in files_inv]
-                    df_inv_all = pd.concat(inv_list, ignore_index=True)
-                    df_inv_all['_MATCH_SKU'] = clean_for_match(df_inv_all.iloc[:, IDX_I_R_ID])
-                    df_inv_all['火箭仓库存'] = clean_num(df_inv_all.iloc[:, IDX_I_R_QTY])
-                    inv_agg = df_inv_all.groupby('_MATCH_SKU')['火箭仓库存'].sum().reset_index()
-                else:
-                    inv_agg = pd.DataFrame(columns=['_MATCH_SKU', '火箭仓库存'])
-
-                if files_inv_j:
-                    inv_j_list = [read_file_strict(f) for f in files_inv_j]
-                    df_inv_j_all = pd.concat(inv_j_list, ignore_index=True)
-                    df_inv_j_all['_MATCH_BAR'] = clean_for_match(df_inv_j_all.iloc[:, IDX_I_J_BAR])
-                    df_inv_j_all['极风库存'] = clean_num(df_inv_j_all.iloc[:, IDX_I_J_QTY])
-                    inv_j_agg = df_inv_j_all.groupby('_MATCH_BAR')['极风库存'].sum().reset_index()
+            recorder = StageRecorder()
+            with st.spinner("正在全速计算中..."), recorder.activate():
+                # --- Step 1-6: 数据清洗、计算、报表构造 (不含筛选) ---
+                inputs = load_inputs(file_master, files_sales, files_ads, files_inv, files_inv_j, cache=get_parse_cache(), stream=stream_mode,
+                                     store=get_aggregate_store() if use_store else None, stored=stored, parquet=backend == 'duckdb')
+                sheets = compute_report(*inputs, backend=backend)
+                # 检索索引随结果建一次，之后每次筛选只做二分查找
+                with stage('search_index', rows=len(sheets[0])):
+                    st.session_state['report'] = (input_key, sheets, ProductIndex(sheets[0], sheets[1]))
+
+                # --- 趋势分析: 销售 / 广告文件按日期入库，合并全部已入库日期 ---
+                if trend_mode:
+                    fact_store = get_fact_store()
+                    undated = ingest_facts(fact_store, files_sales, 'sales', cache=get_parse_cache())
+                    undated += ingest_facts(fact_store, files_ads, 'ads', cache=get_parse_cache())
+                    if undated:
+                        st.warning(f"⚠️ 以下文件名中没有日期，未计入趋势分析: {'、'.join(undated)}")
+                    daily = daily_facts(inputs[0], fact_store.load('sales'), fact_store.load('ads'))
+                    st.session_state['trend'] = (input_key, daily, inventory_by_code(inputs[0], sheets[2]['总库存']))
                 else:
-                    inv_j_agg = pd.DataFrame(columns=['_MATCH_BAR', '极风库存'])
-
-                df_final = pd.merge(df_calc, sales_agg, on='_MATCH_SKU', how='left', sort=False)
-                df_final['SKU销量'] = df_final['SKU销量'].fillna(0).astype(int)
-                df_final = pd.merge(df_final, inv_agg, on='_MATCH_SKU', how='left', sort=False)
-                df_final['火箭仓库存'] = df_final['火箭仓库存'].fillna(0).astype(int)
-                df_final = pd.merge(df_final, inv_j_agg, on='_MATCH_BAR', how='left', sort=False)
-                df_final['极风库存'] = df_final['极风库存'].fillna(0).astype(int)
-
-                df_final['P列_SKU总毛利'] = df_final['SKU销量'] * df_final['_VAL_PROFIT']
-                df_final['Q列_产品总利润'] = df_final.groupby('_MATCH_CODE', sort=False)['P列_SKU总毛利'].transform('sum')
-                df_final['产品总销量'] = df_final.groupby('_MATCH_CODE', sort=False)['SKU销量'].transform('sum')
-                
-                df_final = pd.merge(df_final, ads_agg, on='_MATCH_CODE', how='left', sort=False)
-                df_final['R列_产品总广告费'] = df_final['R列_产品总广告费'].fillna(0).round(0).astype(int)
-                df_final['产品广告销量'] = df_final['产品广告销量'].fillna(0)
-                df_final['S列_最终净利润'] = df_final['Q列_产品总利润'] - df_final['R列_产品总广告费']
-
-                # --- Step 6: 报表构造 ---
-                
-                # Sheet2 (业务报表)
-                df_final['产品_火箭仓库存'] = df_final.groupby('_MATCH_CODE', sort=False)['火箭仓库存'].transform('sum')
-                df_final['产品_极风库存'] = df_final.groupby('_MATCH_CODE', sort=False)['极风库存'].transform('sum')
-                df_final['产品_总库存'] = df_final['产品_火箭仓库存'] + df_final['产品_极风库存']
+                    st.session_state.pop('trend', None)
+            st.session_state['timings'] = recorder.records
+        except Exception as e:
+            st.error(f"❌ 运行出错: {e}")
 
-                df_sheet2 = df_final[[col_code_name, '_MATCH_SHOP', 'Q列_产品总利润', 'R列_产品总广告费', 'S列_最终净利润', '产品总销量', '产品广告销量', '产品_火箭仓库存', '产品_极风库存', '产品_总库存']].copy()
-                df_sheet2 = df_sheet2.drop_duplicates(subset=[col_code_name], keep='first')
-                
-                df_sheet2.rename(columns={
-                    '_MATCH_SHOP': '登品店铺', 
-                    '产品_火箭仓库存': '火箭仓库存', 
-                    '产品_极风库存': '极风库存',
-                    '产品_总库存': '总库存'
-                }, inplace=True)
-
-                df_sheet2['广告费占比'] = df_sheet2.apply(
-                    lambda x: x['R列_产品总广告费'] / x['Q列_产品总利润'] if x['Q列_产品总利润'] != 0 else 0, axis=1
-                )
-                df_sheet2['自然销量'] = df_sheet2['产品总销量'] - df_sheet2['产品广告销量']
-                df_sheet2['自然销量占比'] = df_sheet2.apply(
-                    lambda x: x['自然销量'] / x['产品总销量'] if x['产品总销量'] != 0 else 0, axis=1
-                )
+    report = st.session_state.get('report')
+    if report is not None and report[0] == input_key:
+        try:
+            # --- 筛选 (基于已计算结果) ---
+            with render_recorder.activate(), stage('filter_sheets', rows=len(report[1][0])):
+                df_final_clean, df_sheet2, df_sheet3 = filter_sheets(*report[1], filter_code=filter_code, filter_profit=filter_profit, index=report[2])
+
+            # ==========================================
+            # 🔥 看板展示
+            # ==========================================
+            if df_sheet2.empty:
+                st.warning("⚠️ 筛选结果为空")
+            else:
+                net_profit = df_sheet2['最终净利润'].sum()
+                inv_val = df_sheet3['库存货值'].sum()
+                dead_val = df_sheet3['滞销库存货值'].sum()
+                restock = df_sheet3['待补数量'].sum()
+                total_qty = df_sheet2['产品总销量'].sum()
                 
-                cols_order_s2 = [
-                    col_code_name, '登品店铺', 
-                    'Q列_产品总利润', 'R列_产品总广告费', 'S列_最终净利润', 
-                    '广告费占比', '自然销量占比', 
-                    '总库存', 
-                    '产品总销量', '产品广告销量', '自然销量', '自然销量占比',
-                    '火箭仓库存', '极风库存'
-                ]
-                cols_order_s2 = list(dict.fromkeys(cols_order_s2))
-                df_sheet2 = df_sheet2[cols_order_s2]
-
-                # Sheet3 (库存分析)
-                df_final['火箭仓库存数量'] = df_final['火箭仓库存']
-                df_final['总库存'] = df_final['火箭仓库存数量'] + df_final['极风库存']
-                df_final['库存货值'] = df_final['总库存'] * df_final['_VAL_COST'] * 1.2
-                df_final['安全库存'] = df_final['SKU销量'] * 3
-                df_final['冗余标准'] = df_final['SKU销量'] * 8
-                df_final['待补数量'] = df_final.apply(lambda x: (x['安全库存'] - x['总库存']) if x['总库存'] < x['安全库存'] else 0, axis=1)
+                loss_df = df_sheet2[df_sheet2['最终净利润'] < 0]
+                ad_loss_total = loss_df['最终净利润'].sum()
                 
-                def calc_dead_stock_value(row):
-                    total = row['总库存']
-                    redundant_std = row['冗余标准']
-                    if total == 0 and redundant_std == 0: return 0
-                    if total >= redundant_std: return row['库存货值']
-                    return 0
-                df_final['滞销库存货值'] = df_final.apply(calc_dead_stock_value, axis=1)
-
-                cols_master_AM = df_master.columns[:13].tolist()
+                # 人民币换算
+                net_profit_cny = net_profit * exchange_rate
                 
-                # Sheet1 (利润)
-                cols_s1_final = cols_master_AM + ['SKU销量', 'P列_SKU总毛利', 'Q列_产品总利润', 'R列_产品总广告费', 'S列_最终净利润']
-                df_final_clean = df_final[cols_s1_final].copy()
-
-                cols_inv_final = cols_master_AM + ['火箭仓库存数量', '极风库存', '总库存', '库存货值', '滞销库存货值', '待补数量', 'SKU销量', '安全库存', '冗余标准']
-                df_sheet3 = df_final[cols_inv_final].copy()
-
-                # 重命名
-                rename_dict = {
-                    'P列_SKU总毛利': 'SKU总毛利',
-                    'Q列_产品总利润': '产品总利润',
-                    'R列_产品总广告费': '产品总广告费',
-                    'S列_最终净利润': '最终净利润'
-                }
-                df_final_clean.rename(columns=rename_dict, inplace=True)
-                df_sheet2.rename(columns=rename_dict, inplace=True)
-
-                # --- 筛选 ---
-                if filter_code:
-                    df_final_clean = df_final_clean[df_final_clean[col_code_name].astype(str).str.contains(filter_code, na=False)]
-                    df_sheet2 = df_sheet2[df_sheet2[col_code_name].astype(str).str.contains(filter_code, na=False)]
-                    df_sheet3 = df_sheet3[df_sheet3[col_code_name].astype(str).str.contains(filter_code, na=False)]
-
-                if filter_profit == "只看盈利 (>0)":
-                    df_final_clean = df_final_clean[df_final_clean['最终净利润'] > 0]
-                    valid_indices = df_final_clean.index
-                    df_sheet3 = df_sheet3.loc[df_sheet3.index.isin(valid_indices)]
-                    df_sheet2 = df_sheet2[df_sheet2['最终净利润'] > 0]
-                elif filter_profit == "只看亏损 (<0)":
-                    df_final_clean = df_final_clean[df_final_clean['最终净利润'] < 0]
-                    valid_indices = df_final_clean.index
-                    df_sheet3 = df_sheet3.loc[df_sheet3.index.isin(valid_indices)]
-                    df_sheet2 = df_sheet2[df_sheet2['最终净利润'] < 0]
-
-                # 插入序号
-                df_sheet2.reset_index(drop=True, inplace=True)
-                df_sheet2.insert(0, f"产品总数【{len(df_sheet2)}】", range(1, len(df_sheet2) + 1))
-
-                df_final_clean.reset_index(drop=True, inplace=True)
-                df_final_clean.insert(0, f"SKU总数【{len(df_final_clean)}】", range(1, len(df_final_clean) + 1))
-
-                df_sheet3.reset_index(drop=True, inplace=True)
-                df_sheet3.insert(0, f"SKU总数【{len(df_sheet3)}】", range(1, len(df_sheet3) + 1))
-
-                # ==========================================
-                # 🔥 看板展示
-                # ==========================================
-                if df_sheet2.empty:
-                    st.warning("⚠️ 筛选结果为空")
+                st.subheader("📈 经营概览")
+                k1, k2, k3, k4, k5, k6 = st.columns(6)
+                k1.metric("💰 最终净利润", f"{net_profit:,.0f}", f"≈ ¥ {net_profit_cny:,.0f}", delta_color="normal" if net_profit>0 else "inverse")
+                k2.metric("💸 广告亏损金额", f"¥ {ad_loss_total:,.0f}", delta="需重点优化", delta_color="inverse")
+                k3.metric("📦 总销售数量", f"{total_qty:,.0f}")
+                k4.metric("🏭 库存总货值", f"¥ {inv_val:,.0f}")
+                k5.metric("🔴 滞销资金", f"¥ {dead_val:,.0f}", delta="风险", delta_color="inverse")
+                k6.metric("🚨 待补数量", f"{restock:,.0f}")
+
+                st.divider()
+
+                trend = st.session_state.get('trend')
+                has_trend = trend is not None and trend[0] == input_key and not trend[1].empty
+                tab_names = ["📝 利润分析", "📊 业务报表", "🏭 库存分析"] + (["📅 趋势分析"] if has_trend else [])
+                tab1, tab2, tab3, *tab_trend = st.tabs(tab_names)
+                with tab1:
+                    render_paged(df_final_clean, 'sheet1', lambda page, zebra, view: style_report_page(page, zebra, ['最终净利润']), 1)
+                with tab2:
+                    render_paged(df_sheet2, 'sheet2', lambda page, zebra, view: style_report_page(page, zebra, ['最终净利润']), 2)
+                with tab3:
+                    render_paged(df_sheet3, 'sheet3', lambda page, zebra, view: style_inventory_page(page, zebra, bar_ranges(view)), 1)
+                if has_trend:
+                    with tab_trend[0]:
+                        _, daily, inventory = trend
+                        first_day, last_day = daily['日期'].min().date(), daily['日期'].max().date()
+                        t1, t2 = st.columns(2)
+                        window = t1.selectbox("统计周期 (天)", PERIOD_OPTIONS, format_func=lambda n: f"近 {n} 天 vs 前 {n} 天")
+                        end_day = t2.date_input("截止日期", value=last_day, min_value=first_day, max_value=last_day)
+                        df_trend = period_compare(daily, end_day, window, inventory)
+                        codes = report[2].product_codes(filter_code) if parse_query(filter_code) else None
+                        if codes is not None:
+                            df_trend = df_trend[df_trend['产品编号'].isin(codes)].reset_index(drop=True)
+                        st.line_chart(rolling_trend(daily, window, codes)[['净利润', '广告费']])
+                        st.caption(f"每日滚动 {window} 天合计 · 已入库日期 {first_day} ~ {last_day}")
+                        render_paged(df_trend, 'trend', lambda page, zebra, view: style_report_page(page, zebra, ['本期净利润']), 0)
+
+                # 导出: 点击下载时才生成文件 (筛选变化不会触发导出)
+                sheets = (df_final_clean, df_sheet2, df_sheet3)
+                report_name = f"Coupang_Report_{'-'.join(parse_query(filter_code)) or 'All'}"
+                d1, d2 = st.columns([3, 1])
+                export_fmt = d2.selectbox("导出格式", list(EXPORT_FORMATS), label_visibility="collapsed")
+                ext, mime, make_data, per_shop = EXPORT_FORMATS[export_fmt]
+                if per_shop:
+                    make_export = lambda: make_data(report[1], filter_code, filter_profit, prefix=f"{report_name}_")
                 else:
-                    net_profit = df_sheet2['最终净利润'].sum()
-                    inv_val = df_sheet3['库存货值'].sum()
-                    dead_val = df_sheet3['滞销库存货值'].sum()
-                    restock = df_sheet3['待补数量'].sum()
-                    total_qty = df_sheet2['产品总销量'].sum()
-                    
-                    loss_df = df_sheet2[df_sheet2['最终净利润'] < 0]
-                    ad_loss_total = loss_df['最终净利润'].sum()
-                    
-                    # 人民币换算
-                    net_profit_cny = net_profit * exchange_rate
-                    
-                    st.subheader("📈 经营概览")
-                    k1, k2, k3, k4, k5, k6 = st.columns(6)
-                    k1.metric("💰 最终净利润", f"{net_profit:,.0f}", f"≈ ¥ {net_profit_cny:,.0f}", delta_color="normal" if net_profit>0 else "inverse")
-                    k2.metric("💸 广告亏损金额", f"¥ {ad_loss_total:,.0f}", delta="需重点优化", delta_color="inverse")
-                    k3.metric("📦 总销售数量", f"{total_qty:,.0f}")
-                    k4.metric("🏭 库存总货值", f"¥ {inv_val:,.0f}")
-                    k5.metric("🔴 滞销资金", f"¥ {dead_val:,.0f}", delta="风险", delta_color="inverse")
-                    k6.metric("🚨 待补数量", f"{restock:,.0f}")
-
-                    st.divider()
-
-                    # === 样式函数 ===
-                    def safe_fmt_int(x):
-                        try:
-                            if pd.isna(x) or x == '': return ""
-                            return "{:,.0f}".format(float(x))
-                        except: return str(x)
-
-                    def safe_fmt_pct(x):
-                        try:
-                            if pd.isna(x) or x == '': return ""
-                            return "{:.1%}".format(float(x))
-                        except: return str(x)
-
-                    def get_format_dict(df):
-                        format_dict = {}
-                        for col in df.columns:
-                            c_str = str(col)
-                            if any(x in c_str for x in ['比', '率', '占比']):
-                                format_dict[col] = safe_fmt_pct
-                            elif any(x in c_str for x in ['利润', '费用', '货值', '金额', '毛利', '销量', '库存', '数量', '标准', '待补', '序号', '广告费']):
-                                format_dict[col] = safe_fmt_int
-                        return format_dict
-
-                    def apply_visual_style(df, cols_to_color, is_sheet2=False):
-                        try:
-                            styler = df.style.format(get_format_dict(df))
-                            def zebra_rows(x):
-                                col_idx = 2 if is_sheet2 else 1
-                                codes = x.iloc[:, col_idx].astype(str)
-                                groups = (codes != codes.shift()).cumsum()
-                                is_odd = groups % 2 != 0
-                                styles = pd.DataFrame('', index=x.index, columns=x.columns)
-                                styles.loc[is_odd, :] = 'background-color: #f0f2f6' 
-                                return styles
-                            styler = styler.apply(zebra_rows, axis=None)
-                            
-                            def highlight_cells(x):
-                                styles = []
-                                for col in x.index:
-                                    style = ''
-                                    if col in ['自然销量占比', '总库存']: style += 'font-weight: bold;'
-                                    if col == '广告费占比':
-                                        try:
-                                            if x[col] > 0.5: style += 'color: #d32f2f; font-weight: bold;'
-                                        except: pass
-                                    styles.append(style)
-                                return styles
-                            styler = styler.apply(highlight_cells, axis=1)
-
-                            valid_cols = [c for c in cols_to_color if c in df.columns]
-                            if valid_cols:
-                                styler = styler.background_gradient(subset=valid_cols, cmap='RdYlGn', vmin=-10000, vmax=10000)
-                            return styler
-                        except: return df
-                    
-                    def apply_inventory_style(df):
-                        try:
-                            styler = df.style.format(get_format_dict(df))
-                            def zebra_rows(x):
-                                codes = x.iloc[:, 1].astype(str)
-                                groups = (codes != codes.shift()).cumsum()
-                                is_odd = groups % 2 != 0
-                                styles = pd.DataFrame('', index=x.index, columns=x.columns)
-                                styles.loc[is_odd, :] = 'background-color: #f0f2f6' 
-                                return styles
-                            styler = styler.apply(zebra_rows, axis=None)
-
-                            def highlight_logic(x):
-                                styles = []
-                                for col in x.index:
-                                    style = ''
-                                    if col == '待补数量' and x['待补数量'] > 0:
-                                        style += 'background-color: #fff3cd; color: #e65100; font-weight: bold;'
-                                    if col == '滞销库存货值' and x['滞销库存货值'] > 0:
-                                        style += 'color: #880e4f; font-weight: bold;'
-                                    if col == '总库存':
-                                        try:
-                                            total = x['总库存']
-                                            safe = x['安全库存']
-                                            redundant = x['冗余标准']
-                                            if total == 0 and redundant == 0: pass 
-                                            elif total < safe: style += 'background-color: #ffcccc; color: #cc0000; font-weight: bold;'
-                                            elif total >= redundant: style += 'background-color: #e1bee7; color: #4a148c; font-weight: bold;'
-                                        except: pass
-                                    styles.append(style)
-                                return styles
-                            styler = styler.apply(highlight_logic, axis=1)
-                            return styler
-                        except: return df
-
-                    tab1, tab2, tab3 = st.tabs(["📝 利润分析", "📊 业务报表", "🏭 库存分析"])
-                    with tab1:
-                        st.dataframe(apply_visual_style(df_final_clean, ['最终净利润']), use_container_width=True, height=table_height, hide_index=True)
-                    with tab2:
-                        st.dataframe(apply_visual_style(df_sheet2, ['最终净利润'], True), use_container_width=True, height=table_height, hide_index=True)
-                    with tab3:
-                        try:
-                            st_inv = apply_inventory_style(df_sheet3)
-                            st_inv = st_inv.bar(subset=['总库存'], color='#800080')\
-                                           .bar(subset=['库存货值'], color='#2ca02c')\
-                                           .bar(subset=['滞销库存货值'], color='#880e4f')
-                            st.dataframe(st_inv, use_container_width=True, height=table_height, hide_index=True)
-                        except:
-                            st.dataframe(df_sheet3, use_container_width=True, hide_index=True)
-
-                    output = io.BytesIO()
-                    with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-                        df_final_clean.to_excel(writer, index=False, sheet_name='利润分析')
-                        df_sheet2.to_excel(writer, index=False, sheet_name='业务报表')
-                        df_sheet3.to_excel(writer, index=False, sheet_name='库存分析')
-                        
-                        wb = writer.book
-                        fmt_header = wb.add_format({'bold': True, 'bg_color': '#4472C4', 'font_color': 'white', 'border': 1, 'align': 'center', 'valign': 'vcenter'})
-                        fmt_int = wb.add_format({'num_format': '#,##0', 'align': 'center'})
-                        fmt_pct = wb.add_format({'num_format': '0.0%', 'align': 'center'})
-                        fmt_pct_bold = wb.add_format({'num_format': '0.0%', 'align': 'center', 'bold': True})
-                        fmt_int_bold = wb.add_format({'num_format': '#,##0', 'align': 'center', 'bold': True})
-                        fmt_red_alert = wb.add_format({'num_format': '0.0%', 'align': 'center', 'bold': True, 'font_color': '#9C0006', 'bg_color': '#FFC7CE'})
-                        fmt_grey = wb.add_format({'bg_color': '#BFBFBF', 'border': 1, 'align': 'center', 'valign': 'vcenter'})
-                        fmt_white = wb.add_format({'bg_color': '#FFFFFF', 'border': 1, 'align': 'center', 'valign': 'vcenter'})
-
-                        def set_sheet_format(sheet_name, df_obj, group_col_idx):
-                            ws = writer.sheets[sheet_name]
-                            actual_group_col = group_col_idx + 1 if sheet_name == '业务报表' else group_col_idx
-                            raw_codes = df_obj.iloc[:, actual_group_col].astype(str).tolist()
-                            clean_codes = [str(x).replace('.0','').replace('"','').strip().upper() for x in raw_codes]
-                            is_grey = False
-                            for i in range(len(raw_codes)):
-                                if i > 0 and clean_codes[i] != clean_codes[i-1]: is_grey = not is_grey
-                                ws.set_row(i + 1, None, fmt_grey if is_grey else fmt_white)
-                            
-                            for i, col in enumerate(df_obj.columns):
-                                c_str = str(col)
-                                width = 12
-                                cell_fmt = None
-                                is_bold_col = col in ['自然销量占比', '总库存']
-                                if any(x in c_str for x in ['比', '率', '占比']):
-                                    cell_fmt = fmt_pct_bold if is_bold_col else fmt_pct
-                                    width = 12
-                                elif any(x in c_str for x in ['利润', '费用', '货值', '金额', '毛利', '销量', '库存', '数量', '标准', '待补', '序号', '广告费']):
-                                    cell_fmt = fmt_int_bold if is_bold_col else fmt_int
-                                    width = 15
-                                if cell_fmt: ws.set_column(i, i, width, cell_fmt)
-                                else: ws.set_column(i, i, width)
-                                ws.write(0, i, col, fmt_header)
-                                if col == '广告费占比':
-                                    ws.conditional_format(1, i, len(df_obj), i, {'type': 'cell', 'criteria': '>', 'value': 0.5, 'format': fmt_red_alert})
-
-                        set_sheet_format('利润分析', df_final_clean, IDX_M_CODE)
-                        set_sheet_format('业务报表', df_sheet2, IDX_M_CODE)
-                        set_sheet_format('库存分析', df_sheet3, IDX_M_CODE)
-
-                    st.download_button(
-                        label="📥 下载 Excel",
-                        data=output.getvalue(),
-                        file_name=f"Coupang_Report_{filter_code if filter_code else 'All'}.xlsx",
-                        mime="application/vnd.ms-excel",
-                        type="primary",
-                        use_container_width=True
-                    )
+                    make_export = lambda: make_data(*sheets)
+                export_log = st.session_state.setdefault('export_timings', [])
+                d1.download_button(
+                    label=f"📥 下载 {export_fmt}",
+                    data=lambda: timed_export(make_export, export_log),
+                    file_name=f"{report_name}.{ext}",
+                    mime=mime,
+                    type="primary",
+                    use_container_width=True
+                )
+
+                # 调试面板: 计算 (最近一次生成) + 本次筛选 / 渲染 + 最近一次导出
+                if debug_mode:
+                    with st.expander("🐞 各阶段耗时 / 内存", expanded=True):
+                        records = st.session_state.get('timings', []) + render_recorder.records + export_log
+                        df_timings = pd.DataFrame(records, columns=['stage', 'depth', 'seconds', 'rows', 'rss_mb', 'peak_rss_mb'])
+                        df_timings['stage'] = ['　' * d + name for name, d in zip(df_timings['stage'], df_timings['depth'])]
+                        st.dataframe(df_timings.drop(columns='depth'), use_container_width=True, hide_index=True)
+                        st.caption("rss_mb: 阶段结束时内存；peak_rss_mb: 阶段内峰值 (仅主进程)")
 
         except Exception as e:
             st.error(f"❌ 运行出错: {e}")
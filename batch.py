@@ -0,0 +1,79 @@
+import io
+import os
+import re
+import tempfile
+import zipfile
+
+from engine import IDX_M_SHOP, PROFIT_ALL, filter_sheets
+from export import export_excel
+from ingest import DEFAULT_WORKERS, _get_process_pool
+from instrument import stage
+
+# ==========================================
+# 按店铺批量导出: 一次读取 + 计算，按「登品店铺」拆分三张报表，每个店铺一个 Excel，打包为 zip
+# 拆分只做一次分组 (不按店铺重复筛选)，各店铺工作簿在进程池中并行写入 (xlsxwriter 为 CPU 密集)
+# 注: 产品级指标 (产品总利润 / 广告费等) 仍按产品编号全局汇总，与合并报表一致；
+#     业务报表中的产品归入其第一行 SKU 所在店铺 (与合并报表的「登品店铺」列相同)
+# ==========================================
+
+# 文件名中不允许的字符
+_UNSAFE_CHARS = re.compile(r'[\\/:*?"<>|\s]+')
+
+# 店铺为空 (NaN / 空白) 的行归入「未知店铺」，不能在分组时丢掉
+UNKNOWN_SHOP = '未知店铺'
+
+def shop_keys(series):
+    keys = series.astype(str).str.strip()
+    return keys.where(keys.notna() & (keys != ''), UNKNOWN_SHOP)
+
+# 未筛选的三张报表 (compute_report 的结果) 按店铺拆分，返回 [(店铺, (利润分析, 业务报表, 库存分析)), ...] (按店铺名排序)
+def split_by_shop(df_final_clean, df_sheet2, df_sheet3):
+    sku_shop = shop_keys(df_final_clean.iloc[:, IDX_M_SHOP])
+    prod_shop = shop_keys(df_sheet2['登品店铺'])
+    sku_groups = sku_shop.groupby(sku_shop.to_numpy(), sort=True).indices
+    prod_groups = prod_shop.groupby(prod_shop.to_numpy(), sort=False).indices
+    parts = []
+    for shop, rows in sku_groups.items():
+        prods = prod_groups.get(shop, [])
+        parts.append((shop, (df_final_clean.iloc[rows], df_sheet2.iloc[prods], df_sheet3.iloc[rows])))
+    return parts
+
+# 店铺名 -> 压缩包内文件名 (去掉非法字符，重名时加序号)
+def shop_file_name(shop, prefix, used):
+    name = f"{prefix}{_UNSAFE_CHARS.sub('_', shop).strip('_') or UNKNOWN_SHOP}"
+    stem, n = name, 2
+    while name in used:
+        name, n = f"{stem}_{n}", n + 1
+    used.add(name)
+    return f"{name}.xlsx"
+
+# 按店铺导出到 zip (output 为路径或可写文件对象)，筛选条件与页面 / 命令行相同，筛选后为空的店铺跳过
+# 返回 [(店铺, SKU 数, 产品数), ...]
+def export_shops(sheets, output, filter_code='', filter_profit=PROFIT_ALL, workers=DEFAULT_WORKERS, prefix=''):
+    jobs, used = [], set()
+    for shop, part in split_by_shop(*sheets):
+        part = filter_sheets(*part, filter_code=filter_code, filter_profit=filter_profit)
+        if len(part[0]) or len(part[1]):
+            jobs.append((shop, shop_file_name(shop, prefix, used), part))
+
+    with stage('export:shops', rows=sum(len(part[0]) for _, _, part in jobs)), tempfile.TemporaryDirectory() as tmp:
+        paths = [os.path.join(tmp, name) for _, name, _ in jobs]
+        if workers <= 1 or len(jobs) <= 1:
+            for (_, _, part), path in zip(jobs, paths):
+                export_excel(*part, path)
+        else:
+            pool = _get_process_pool(workers)
+            for future in [pool.submit(export_excel, *part, path) for (_, _, part), path in zip(jobs, paths)]:
+                future.result()
+
+        # xlsx 本身已压缩，压缩包内直接存储
+        with zipfile.ZipFile(output, 'w', zipfile.ZIP_STORED) as zf:
+            for (_, name, _), path in zip(jobs, paths):
+                zf.write(path, name)
+    return [(shop, len(part[0]), len(part[1])) for shop, _, part in jobs]
+
+# 生成按店铺拆分的 zip 字节串 (供下载按钮使用)
+def shop_reports_zip(sheets, filter_code='', filter_profit=PROFIT_ALL, workers=DEFAULT_WORKERS, prefix=''):
+    buf = io.BytesIO()
+    export_shops(sheets, buf, filter_code, filter_profit, workers, prefix)
+    return buf.getvalue()
@@ -0,0 +1,88 @@
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from engine import add_inventory_metrics, add_product_metrics
+
+# ==========================================
+# 指标计算基准: 逐行 apply (旧实现) vs 向量化 (engine)
+# 用法: python benchmarks/bench_metrics.py --rows 100000
+# ==========================================
+
+# --- 旧实现 (逐行 apply)，仅作为对照 ---
+def legacy_product_metrics(df_sheet2):
+    df_sheet2['广告费占比'] = df_sheet2.apply(
+        lambda x: x['R列_产品总广告费'] / x['Q列_产品总利润'] if x['Q列_产品总利润'] != 0 else 0, axis=1
+    )
+    df_sheet2['自然销量'] = df_sheet2['产品总销量'] - df_sheet2['产品广告销量']
+    df_sheet2['自然销量占比'] = df_sheet2.apply(
+        lambda x: x['自然销量'] / x['产品总销量'] if x['产品总销量'] != 0 else 0, axis=1
+    )
+    return df_sheet2
+
+def legacy_inventory_metrics(df_final):
+    df_final['火箭仓库存数量'] = df_final['火箭仓库存']
+    df_final['总库存'] = df_final['火箭仓库存数量'] + df_final['极风库存']
+    df_final['库存货值'] = df_final['总库存'] * df_final['_VAL_COST'] * 1.2
+    df_final['安全库存'] = df_final['SKU销量'] * 3
+    df_final['冗余标准'] = df_final['SKU销量'] * 8
+    df_final['待补数量'] = df_final.apply(lambda x: (x['安全库存'] - x['总库存']) if x['总库存'] < x['安全库存'] else 0, axis=1)
+
+    def calc_dead_stock_value(row):
+        total = row['总库存']
+        redundant_std = row['冗余标准']
+        if total == 0 and redundant_std == 0: return 0
+        if total >= redundant_std: return row['库存货值']
+        return 0
+    df_final['滞销库存货值'] = df_final.apply(calc_dead_stock_value, axis=1)
+    return df_final
+
+# --- 合成数据 (含 0 分母、0 库存等边界情况) ---
+def make_frames(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    qty = rng.integers(0, 50, rows)
+    qty[rng.random(rows) < 0.2] = 0
+    df_sheet2 = pd.DataFrame({
+        'Q列_产品总利润': rng.integers(-50000, 200000, rows).astype(float),
+        'R列_产品总广告费': rng.integers(0, 80000, rows),
+        '产品总销量': qty,
+        '产品广告销量': rng.integers(0, 20, rows).astype(float),
+    })
+    df_sheet2.loc[rng.random(rows) < 0.1, 'Q列_产品总利润'] = 0.0
+    df_final = pd.DataFrame({
+        '火箭仓库存': rng.integers(0, 300, rows),
+        '极风库存': rng.integers(0, 300, rows),
+        '_VAL_COST': rng.integers(1000, 30000, rows).astype(float),
+        'SKU销量': qty,
+    })
+    df_final.loc[rng.random(rows) < 0.2, ['火箭仓库存', '极风库存']] = 0
+    return df_sheet2, df_final
+
+def timed(func, df):
+    t0 = time.perf_counter()
+    result = func(df.copy())
+    return result, time.perf_counter() - t0
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="指标计算基准")
+    parser.add_argument('--rows', type=int, default=100_000)
+    args = parser.parse_args(argv)
+
+    df_sheet2, df_final = make_frames(args.rows)
+    cases = [
+        ('业务报表指标', df_sheet2, legacy_product_metrics, add_product_metrics),
+        ('库存分析指标', df_final, legacy_inventory_metrics, add_inventory_metrics),
+    ]
+    for name, df, legacy, vectorized in cases:
+        expected, t_legacy = timed(legacy, df)
+        got, t_vec = timed(vectorized, df)
+        pd.testing.assert_frame_equal(expected, got, check_dtype=False)
+        print(f"{name}: {args.rows:,} 行  apply {t_legacy:.3f}s -> 向量化 {t_vec:.4f}s  ({t_legacy / t_vec:,.0f}x, 结果一致)")
+
+if __name__ == '__main__':
+    main()
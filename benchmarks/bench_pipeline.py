@@ -0,0 +1,302 @@
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from agg_store import AggregateStore
+from engine import (
+    IDX_A_CAMPAIGN, IDX_A_GROUP, IDX_A_SALES, IDX_A_SPEND, IDX_I_J_BAR, IDX_I_J_QTY, IDX_I_R_ID, IDX_I_R_QTY,
+    IDX_M_BAR, IDX_M_CODE, IDX_M_COST, IDX_M_PROFIT, IDX_M_SHOP, IDX_M_SKU, IDX_S_ID, IDX_S_QTY,
+    available_backends, build_report, clean_for_match, clean_num, compute_report, extract_code_from_text,
+    filter_sheets, read_file_strict, read_files,
+)
+from export import export_excel
+from gen_data import ENCODINGS, FORMATS, generate
+from ingest import DEFAULT_WORKERS, load_inputs
+from instrument import StageRecorder, stage
+from parse_cache import ParseCache
+
+# ==========================================
+# 流水线基准: 合成数据上比较各读取 / 汇总方式的分阶段耗时与端到端耗时，并校验结果一致
+# 参照实现为最初的流水线 (legacy: 逐个读取 -> 逐行提取编号 -> 按字符串键依次 merge)，
+# 其余方式 (含 engine.build_report) 的三张报表必须与之相同
+# 用法: python benchmarks/bench_pipeline.py --sizes 1000 10000 100000 --format mixed --jsonl bench.jsonl
+# ==========================================
+
+# 部分和按文件 / 按块累加的方式，含税广告费取整时 .5 附近可能相差 1
+# 只有取整后的广告费、由其算出的净利润与广告费占比放宽，其余列严格比较
+ROUNDING_VARIANTS = {'stream', 'store'}
+ROUNDED_COLUMNS = ['产品总广告费', '最终净利润']
+
+# --- 旧实现 (最初的流水线)，仅作为对照 ---
+def legacy_read(path):
+    if path.endswith('.csv'):
+        try:
+            return pd.read_csv(path, dtype=str)
+        except UnicodeDecodeError:
+            return pd.read_csv(path, dtype=str, encoding='gbk')
+    return pd.read_excel(path, dtype=str, engine='openpyxl')
+
+def legacy_concat(paths):
+    return pd.concat([legacy_read(p) for p in paths], ignore_index=True) if paths else None
+
+def legacy_report(paths):
+    df_master = legacy_read(paths['master'])
+    col_code_name = df_master.columns[IDX_M_CODE]
+    df_calc = df_master.copy()
+    df_calc['_MATCH_SKU'] = clean_for_match(df_calc.iloc[:, IDX_M_SKU])
+    df_calc['_MATCH_BAR'] = clean_for_match(df_calc.iloc[:, IDX_M_BAR])
+    df_calc['_MATCH_CODE'] = clean_for_match(df_calc.iloc[:, IDX_M_CODE])
+    df_calc['_VAL_PROFIT'] = clean_num(df_calc.iloc[:, IDX_M_PROFIT])
+    df_calc['_VAL_COST'] = clean_num(df_calc.iloc[:, IDX_M_COST])
+    df_calc['_MATCH_SHOP'] = df_calc.iloc[:, IDX_M_SHOP].astype(str).str.strip()
+
+    df_sales_all = legacy_concat(paths['sales'])
+    df_sales_all['_MATCH_SKU'] = clean_for_match(df_sales_all.iloc[:, IDX_S_ID])
+    df_sales_all['销量'] = clean_num(df_sales_all.iloc[:, IDX_S_QTY])
+    sales_agg = df_sales_all.groupby('_MATCH_SKU')['销量'].sum().reset_index().rename(columns={'销量': 'SKU销量'})
+
+    df_ads_all = legacy_concat(paths['ads'])
+    df_ads_all['含税广告费'] = clean_num(df_ads_all.iloc[:, IDX_A_SPEND]) * 1.1
+    df_ads_all['广告销量'] = clean_num(df_ads_all.iloc[:, IDX_A_SALES])
+    df_ads_all['Code_Group'] = df_ads_all.iloc[:, IDX_A_GROUP].apply(extract_code_from_text)
+    df_ads_all['Code_Campaign'] = df_ads_all.iloc[:, IDX_A_CAMPAIGN].apply(extract_code_from_text)
+    df_ads_all['_MATCH_CODE'] = df_ads_all['Code_Group'].fillna(df_ads_all['Code_Campaign'])
+    valid_ads = df_ads_all.dropna(subset=['_MATCH_CODE'])
+    ads_agg = valid_ads.groupby('_MATCH_CODE')[['含税广告费', '广告销量']].sum().reset_index()
+    ads_agg.rename(columns={'含税广告费': 'R列_产品总广告费', '广告销量': '产品广告销量'}, inplace=True)
+
+    df_inv_all = legacy_concat(paths['inv'])
+    if df_inv_all is not None:
+        df_inv_all['_MATCH_SKU'] = clean_for_match(df_inv_all.iloc[:, IDX_I_R_ID])
+        df_inv_all['火箭仓库存'] = clean_num(df_inv_all.iloc[:, IDX_I_R_QTY])
+        inv_agg = df_inv_all.groupby('_MATCH_SKU')['火箭仓库存'].sum().reset_index()
+    else:
+        inv_agg = pd.DataFrame(columns=['_MATCH_SKU', '火箭仓库存'])
+    df_inv_j_all = legacy_concat(paths['inv_j'])
+    if df_inv_j_all is not None:
+        df_inv_j_all['_MATCH_BAR'] = clean_for_match(df_inv_j_all.iloc[:, IDX_I_J_BAR])
+        df_inv_j_all['极风库存'] = clean_num(df_inv_j_all.iloc[:, IDX_I_J_QTY])
+        inv_j_agg = df_inv_j_all.groupby('_MATCH_BAR')['极风库存'].sum().reset_index()
+    else:
+        inv_j_agg = pd.DataFrame(columns=['_MATCH_BAR', '极风库存'])
+
+    df_final = pd.merge(df_calc, sales_agg, on='_MATCH_SKU', how='left', sort=False)
+    df_final['SKU销量'] = df_final['SKU销量'].fillna(0).astype(int)
+    df_final = pd.merge(df_final, inv_agg, on='_MATCH_SKU', how='left', sort=False)
+    df_final['火箭仓库存'] = df_final['火箭仓库存'].fillna(0).astype(int)
+    df_final = pd.merge(df_final, inv_j_agg, on='_MATCH_BAR', how='left', sort=False)
+    df_final['极风库存'] = df_final['极风库存'].fillna(0).astype(int)
+    df_final['P列_SKU总毛利'] = df_final['SKU销量'] * df_final['_VAL_PROFIT']
+    df_final['Q列_产品总利润'] = df_final.groupby('_MATCH_CODE', sort=False)['P列_SKU总毛利'].transform('sum')
+    df_final['产品总销量'] = df_final.groupby('_MATCH_CODE', sort=False)['SKU销量'].transform('sum')
+    df_final = pd.merge(df_final, ads_agg, on='_MATCH_CODE', how='left', sort=False)
+    df_final['R列_产品总广告费'] = df_final['R列_产品总广告费'].fillna(0).round(0).astype(int)
+    df_final['产品广告销量'] = df_final['产品广告销量'].fillna(0)
+    df_final['S列_最终净利润'] = df_final['Q列_产品总利润'] - df_final['R列_产品总广告费']
+
+    df_final['产品_火箭仓库存'] = df_final.groupby('_MATCH_CODE', sort=False)['火箭仓库存'].transform('sum')
+    df_final['产品_极风库存'] = df_final.groupby('_MATCH_CODE', sort=False)['极风库存'].transform('sum')
+    df_final['产品_总库存'] = df_final['产品_火箭仓库存'] + df_final['产品_极风库存']
+    df_sheet2 = df_final[[col_code_name, '_MATCH_SHOP', 'Q列_产品总利润', 'R列_产品总广告费', 'S列_最终净利润', '产品总销量', '产品广告销量', '产品_火箭仓库存', '产品_极风库存', '产品_总库存']].copy()
+    df_sheet2 = df_sheet2.drop_duplicates(subset=[col_code_name], keep='first')
+    df_sheet2.rename(columns={'_MATCH_SHOP': '登品店铺', '产品_火箭仓库存': '火箭仓库存', '产品_极风库存': '极风库存', '产品_总库存': '总库存'}, inplace=True)
+    df_sheet2['广告费占比'] = df_sheet2.apply(lambda x: x['R列_产品总广告费'] / x['Q列_产品总利润'] if x['Q列_产品总利润'] != 0 else 0, axis=1)
+    df_sheet2['自然销量'] = df_sheet2['产品总销量'] - df_sheet2['产品广告销量']
+    df_sheet2['自然销量占比'] = df_sheet2.apply(lambda x: x['自然销量'] / x['产品总销量'] if x['产品总销量'] != 0 else 0, axis=1)
+    cols_order_s2 = list(dict.fromkeys([
+        col_code_name, '登品店铺', 'Q列_产品总利润', 'R列_产品总广告费', 'S列_最终净利润', '广告费占比', '自然销量占比',
+        '总库存', '产品总销量', '产品广告销量', '自然销量', '自然销量占比', '火箭仓库存', '极风库存',
+    ]))
+    df_sheet2 = df_sheet2[cols_order_s2]
+
+    df_final['火箭仓库存数量'] = df_final['火箭仓库存']
+    df_final['总库存'] = df_final['火箭仓库存数量'] + df_final['极风库存']
+    df_final['库存货值'] = df_final['总库存'] * df_final['_VAL_COST'] * 1.2
+    df_final['安全库存'] = df_final['SKU销量'] * 3
+    df_final['冗余标准'] = df_final['SKU销量'] * 8
+    df_final['待补数量'] = df_final.apply(lambda x: (x['安全库存'] - x['总库存']) if x['总库存'] < x['安全库存'] else 0, axis=1)
+
+    def calc_dead_stock_value(row):
+        total, redundant_std = row['总库存'], row['冗余标准']
+        if total == 0 and redundant_std == 0: return 0
+        if total >= redundant_std: return row['库存货值']
+        return 0
+    df_final['滞销库存货值'] = df_final.apply(calc_dead_stock_value, axis=1)
+
+    cols_master_AM = df_master.columns[:13].tolist()
+    df_final_clean = df_final[cols_master_AM + ['SKU销量', 'P列_SKU总毛利', 'Q列_产品总利润', 'R列_产品总广告费', 'S列_最终净利润']].copy()
+    df_sheet3 = df_final[cols_master_AM + ['火箭仓库存数量', '极风库存', '总库存', '库存货值', '滞销库存货值', '待补数量', 'SKU销量', '安全库存', '冗余标准']].copy()
+    rename_dict = {'P列_SKU总毛利': 'SKU总毛利', 'Q列_产品总利润': '产品总利润', 'R列_产品总广告费': '产品总广告费', 'S列_最终净利润': '最终净利润'}
+    df_final_clean.rename(columns=rename_dict, inplace=True)
+    df_sheet2.rename(columns=rename_dict, inplace=True)
+
+    df_sheet2.reset_index(drop=True, inplace=True)
+    df_sheet2.insert(0, f"产品总数【{len(df_sheet2)}】", range(1, len(df_sheet2) + 1))
+    df_final_clean.reset_index(drop=True, inplace=True)
+    df_final_clean.insert(0, f"SKU总数【{len(df_final_clean)}】", range(1, len(df_final_clean) + 1))
+    df_sheet3.reset_index(drop=True, inplace=True)
+    df_sheet3.insert(0, f"SKU总数【{len(df_sheet3)}】", range(1, len(df_sheet3) + 1))
+    return df_final_clean, df_sheet2, df_sheet3
+
+def legacy(paths, workdir, workers):
+    with stage('legacy'):
+        return legacy_report(paths)
+
+def build(paths, workdir, workers):
+    with stage('read'):
+        frames = [read_file_strict(paths['master']), read_files(paths['sales']), read_files(paths['ads']), read_files(paths['inv']), read_files(paths['inv_j'])]
+    return build_report(*frames)
+
+def pipeline(paths, backend='pandas', **kwargs):
+    inputs = load_inputs(paths['master'], paths['sales'], paths['ads'], paths['inv'], paths['inv_j'], **kwargs)
+    sheets = compute_report(*inputs, backend=backend)
+    with stage('filter_sheets'):
+        return filter_sheets(*sheets)
+
+def serial(paths, workdir, workers):
+    return pipeline(paths, workers=1)
+
+def parallel(paths, workdir, workers):
+    return pipeline(paths, workers=workers)
+
+def cache_warm(paths, workdir, workers):
+    return pipeline(paths, workers=workers, cache=ParseCache(os.path.join(workdir, 'cache')))
+
+def stream(paths, workdir, workers):
+    return pipeline(paths, workers=workers, stream=True)
+
+def store(paths, workdir, workers):
+    db = os.path.join(workdir, 'store', 'agg.sqlite')
+    shutil.rmtree(os.path.dirname(db), ignore_errors=True)
+    return pipeline(paths, workers=workers, store=AggregateStore(db))
+
+def duckdb(paths, workdir, workers):
+    return pipeline(paths, workers=workers, backend='duckdb')
+
+# 解析缓存已预热: 清洗结果不读入 pandas，DuckDB 直接扫描缓存中的 Parquet 文件
+def duckdb_parquet(paths, workdir, workers):
+    return pipeline(paths, workers=workers, backend='duckdb', cache=ParseCache(os.path.join(workdir, 'cache')), parquet=True)
+
+# 生成数据 (指定 --data-dir 时复用已生成的文件)
+def prepare_data(data_dir, n_sku, files, fmt, encoding):
+    manifest = os.path.join(data_dir, 'paths.json')
+    if os.path.exists(manifest):
+        with open(manifest, encoding='utf-8') as f:
+            return json.load(f)
+    paths = generate(data_dir, n_sku, files, fmt, encoding)
+    with open(manifest, 'w', encoding='utf-8') as f:
+        json.dump(paths, f, ensure_ascii=False)
+    return paths
+
+# 方式名 -> (函数, 是否先预热一次 (不计时))
+VARIANTS = {
+    'legacy': (legacy, False),
+    'build_report': (build, False),
+    'serial': (serial, False),
+    'parallel': (parallel, False),
+    'cache_warm': (cache_warm, True),
+    'stream': (stream, False),
+    'store': (store, False),
+}
+# DuckDB 引擎 (与 pandas 版对比结果)，未安装 duckdb 时不参与
+if 'duckdb' in available_backends():
+    VARIANTS['duckdb'] = (duckdb, False)
+    VARIANTS['duckdb_parquet'] = (duckdb_parquet, True)
+
+# 三张报表逐一比较 (忽略 dtype 差异，数值严格相等)
+# 取整方式的变体: ROUNDED_COLUMNS 允许相差 1，广告费占比允许相差 1 / |产品总利润|
+def assert_same(expected, got, variant):
+    for name, a, b in zip(('利润分析', '业务报表', '库存分析'), expected, got):
+        try:
+            if variant in ROUNDING_VARIANTS:
+                loose = [c for c in ROUNDED_COLUMNS if c in a.columns]
+                pd.testing.assert_frame_equal(a[loose], b[loose], check_dtype=False, check_exact=False, atol=1, rtol=0)
+                if '广告费占比' in a.columns:
+                    profit = a['产品总利润'].abs().to_numpy(dtype=float)
+                    bound = np.divide(1.0, profit, out=np.zeros_like(profit), where=profit != 0) + 1e-12
+                    diff = (a['广告费占比'] - b['广告费占比']).abs().to_numpy(dtype=float)
+                    assert (diff <= bound).all(), f"广告费占比 超出取整误差范围: 最大差 {diff.max()}"
+                    loose.append('广告费占比')
+                a, b = a.drop(columns=loose), b.drop(columns=loose)
+            pd.testing.assert_frame_equal(a, b, check_dtype=False, check_exact=True)
+        except AssertionError as e:
+            raise AssertionError(f"{variant} / {name} 与参照实现不一致: {e}") from None
+
+def run_variant(name, paths, workdir, workers):
+    func, warm = VARIANTS[name]
+    if warm:
+        func(paths, workdir, workers)
+    recorder = StageRecorder()
+    t0 = time.perf_counter()
+    with recorder.activate():
+        sheets = func(paths, workdir, workers)
+    return sheets, time.perf_counter() - t0, recorder
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="报表流水线基准 (合成数据)")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1_000, 10_000, 100_000], help="SKU 数量")
+    parser.add_argument('--files', type=int, default=3, help="每组文件数")
+    parser.add_argument('--format', choices=FORMATS, default='csv')
+    parser.add_argument('--encoding', choices=ENCODINGS, default='utf-8')
+    parser.add_argument('--variants', nargs='+', choices=list(VARIANTS), default=list(VARIANTS))
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS)
+    parser.add_argument('--no-export', action='store_true', help="不计时 Excel 导出")
+    parser.add_argument('--data-dir', help="数据目录 (保留生成的文件，重复运行时复用)")
+    parser.add_argument('--jsonl', help="各阶段记录以 JSON lines 追加写入")
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    variants = ['legacy'] + [v for v in args.variants if v != 'legacy']
+    tmp = tempfile.mkdtemp(prefix='coupang_bench_')
+    data_root = args.data_dir or tmp
+    summary = []
+    try:
+        for n_sku in args.sizes:
+            data_dir = os.path.join(data_root, f"{n_sku}_{args.files}_{args.format}_{args.encoding}")
+            t0 = time.perf_counter()
+            paths = prepare_data(data_dir, n_sku, args.files, args.format, args.encoding)
+            print(f"\n=== {n_sku:,} SKU ({args.files} 文件/组, {args.format}, {args.encoding}) 数据准备 {time.perf_counter() - t0:.1f}s ===")
+
+            expected = None
+            for name in variants:
+                workdir = os.path.join(tmp, f"{n_sku}_{name}")
+                os.makedirs(workdir, exist_ok=True)
+                sheets, seconds, recorder = run_variant(name, paths, workdir, args.workers)
+                if expected is None:
+                    expected = sheets
+                else:
+                    assert_same(expected, sheets, name)
+                stages = '  '.join(f"{r['stage']} {r['seconds']:.2f}s" for r in recorder.records if r['depth'] == 0)
+                peak = max((r['peak_rss_mb'] or 0 for r in recorder.records), default=0)
+                print(f"{name:<14} {seconds:8.2f}s  峰值 {peak:7.0f} MB  | {stages}")
+                summary.append({'skus': n_sku, 'variant': name, 'seconds': round(seconds, 3)})
+                if args.jsonl:
+                    recorder.write_jsonl(args.jsonl, skus=n_sku, files=args.files, format=args.format, encoding=args.encoding, variant=name, total_seconds=round(seconds, 4))
+
+            if not args.no_export:
+                recorder = StageRecorder()
+                with recorder.activate():
+                    export_excel(*expected, os.path.join(tmp, f"{n_sku}.xlsx"))
+                print(f"{'export':<14} {recorder.total_seconds():8.2f}s")
+                if args.jsonl:
+                    recorder.write_jsonl(args.jsonl, skus=n_sku, files=args.files, format=args.format, encoding=args.encoding, variant='export')
+            print(f"结果一致: {', '.join(variants[1:])} == legacy")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    print("\n端到端耗时 (秒):")
+    print(pd.DataFrame(summary).pivot(index='variant', columns='skus', values='seconds').reindex(variants).to_string())
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
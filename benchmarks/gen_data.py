@@ -0,0 +1,146 @@
+import argparse
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from engine import (
+    IDX_A_CAMPAIGN, IDX_A_GROUP, IDX_A_SALES, IDX_A_SPEND,
+    IDX_I_J_BAR, IDX_I_J_QTY, IDX_I_R_ID, IDX_I_R_QTY,
+    IDX_M_BAR, IDX_M_CODE, IDX_M_COST, IDX_M_PROFIT, IDX_M_SHOP, IDX_M_SKU,
+    IDX_S_ID, IDX_S_QTY, MASTER_COLUMNS,
+)
+
+# ==========================================
+# 合成测试数据: 按 IDX_* 列号生成 Master / Sales / Ads / 火箭仓 / 极风 文件
+# 包含真实导出中的常见情况: SKU 带 .0 / 引号、千分位数字、大小写混合的产品编号、
+# 无法识别编号的广告组、主表中不存在的 SKU、同一 SKU 分布在多个文件
+# 用法: python benchmarks/gen_data.py --skus 10000 --files 3 --format mixed --encoding gbk -o data/
+# ==========================================
+
+FORMATS = ('csv', 'xlsx', 'mixed')
+ENCODINGS = ('utf-8', 'utf-8-sig', 'gbk')
+SHOPS = ['首尔旗舰店', '釜山店', '仁川店', 'Coupang-A', 'Coupang-B']
+FIRST_DAY = pd.Timestamp('2026-05-01')
+
+# 空表: width 列，表头为「列N」，known 中的列号使用指定表头
+def blank_frame(n_rows, width, known):
+    headers = [known.get(i, f"列{i + 1}") for i in range(width)]
+    return pd.DataFrame({h: np.full(n_rows, '', dtype=object) for h in headers})
+
+def set_col(df, idx, values):
+    df[df.columns[idx]] = values
+
+# 千分位格式 (部分行)，模拟 "1,234" 形式的数字
+def with_commas(values, rng, share=0.3):
+    out = values.astype(str).astype(object)
+    pick = rng.random(len(values)) < share
+    out[pick] = [f"{v:,}" for v in values[pick]]
+    return out
+
+# 写文件: csv 使用指定编码，xlsx 用 xlsxwriter (比 openpyxl 快)
+def write(df, path_stem, fmt, encoding):
+    if fmt == 'xlsx':
+        path = f"{path_stem}.xlsx"
+        df.to_excel(path, index=False, engine='xlsxwriter')
+    else:
+        path = f"{path_stem}.csv"
+        df.to_csv(path, index=False, encoding=encoding)
+    return path
+
+def file_format(fmt, i):
+    if fmt == 'mixed':
+        return 'xlsx' if i % 2 else 'csv'
+    return fmt
+
+# 生成全部文件，返回 {组名: [路径, ...]} (master 为单个路径)
+def generate(out_dir, n_sku=10_000, files=3, fmt='csv', encoding='utf-8', seed=0):
+    rng = np.random.default_rng(seed)
+    os.makedirs(out_dir, exist_ok=True)
+    n_prod = max(1, n_sku // 4)
+
+    # --- Master: 按产品编号排序 (与真实主表一致，斑马纹按编号分组) ---
+    prod = np.sort(rng.integers(0, n_prod, n_sku))
+    codes = np.array([f"C{10000 + p}" for p in prod], dtype=object)
+    sku_ids = (7_000_000_000 + rng.choice(900_000_000, n_sku, replace=False)).astype(np.int64)
+    barcodes = np.array([f"880{b:010d}" for b in rng.choice(10_000_000_000, n_sku, replace=False)], dtype=object)
+    master = blank_frame(n_sku, MASTER_COLUMNS, {
+        IDX_M_CODE: '产品编号', IDX_M_SHOP: '登品店铺', IDX_M_SKU: 'SKU ID',
+        IDX_M_COST: '成本', IDX_M_PROFIT: '利润', IDX_M_BAR: '条码',
+    })
+    set_col(master, IDX_M_CODE, codes)
+    set_col(master, IDX_M_SHOP, np.array(SHOPS, dtype=object)[prod % len(SHOPS)])
+    set_col(master, IDX_M_SKU, sku_ids.astype(str))
+    set_col(master, IDX_M_COST, with_commas(rng.integers(1_000, 30_000, n_sku), rng))
+    set_col(master, IDX_M_PROFIT, with_commas(rng.integers(-3_000, 12_000, n_sku), rng))
+    set_col(master, IDX_M_BAR, barcodes)
+    paths = {'master': write(master, os.path.join(out_dir, 'master'), file_format(fmt, 0), encoding)}
+
+    # --- Sales: 每个文件覆盖约 80% SKU + 少量主表中不存在的 SKU ---
+    paths['sales'] = []
+    for i in range(files):
+        pick = np.flatnonzero(rng.random(n_sku) < 0.8)
+        ids = sku_ids[pick].astype(str).astype(object)
+        n_unknown = max(1, len(pick) // 50)
+        ids = np.concatenate([ids, (9_900_000_000 + rng.integers(0, 1_000_000, n_unknown)).astype(str).astype(object)])
+        variant = rng.random(len(ids))
+        ids = np.where(variant < 0.05, [f"{x}.0" for x in ids], np.where(variant < 0.08, [f'"{x}"' for x in ids], ids))
+        sales = blank_frame(len(ids), IDX_S_QTY + 2, {IDX_S_ID: '注册商品ID', IDX_S_QTY: '销量'})
+        set_col(sales, IDX_S_ID, ids)
+        set_col(sales, IDX_S_QTY, with_commas(rng.integers(0, 3_000, len(ids)), rng))
+        day = FIRST_DAY + pd.Timedelta(days=i)
+        paths['sales'].append(write(sales, os.path.join(out_dir, f"sales_{day:%Y-%m-%d}"), file_format(fmt, i), encoding))
+
+    # --- Ads: 每个 SKU 约 2 行广告，编号出现在广告组或广告活动名称中 (大小写混合)，部分无法识别 ---
+    paths['ads'] = []
+    n_ads = max(1, 2 * n_sku // files)
+    for i in range(files):
+        p = rng.integers(0, n_prod, n_ads)
+        kind = rng.random(n_ads)
+        group = np.where(kind < 0.5, [f"广告组 C{10000 + x}" for x in p], '通用广告组')
+        campaign = np.where(kind < 0.5, '品牌活动', np.where(kind < 0.9, [f"camp_c{10000 + x}_auto" for x in p], '自动投放'))
+        ads = blank_frame(n_ads, IDX_A_SALES + 1, {
+            IDX_A_CAMPAIGN: '广告活动', IDX_A_GROUP: '广告组', IDX_A_SPEND: '广告费', IDX_A_SALES: '广告销量',
+        })
+        set_col(ads, IDX_A_CAMPAIGN, campaign.astype(object))
+        set_col(ads, IDX_A_GROUP, group.astype(object))
+        set_col(ads, IDX_A_SPEND, with_commas(rng.integers(0, 80_000, n_ads), rng))
+        set_col(ads, IDX_A_SALES, rng.integers(0, 30, n_ads).astype(str).astype(object))
+        day = FIRST_DAY + pd.Timedelta(days=i)
+        paths['ads'].append(write(ads, os.path.join(out_dir, f"ads_{day:%Y%m%d}"), file_format(fmt, i + 1), encoding))
+
+    # --- 火箭仓 / 极风: SKU / 条码 分散在多个文件 ---
+    paths['inv'], paths['inv_j'] = [], []
+    for i, part in enumerate(np.array_split(rng.permutation(n_sku), files)):
+        rocket = blank_frame(len(part), IDX_I_R_QTY + 1, {IDX_I_R_ID: 'SKU ID', IDX_I_R_QTY: '可售库存'})
+        set_col(rocket, IDX_I_R_ID, sku_ids[part].astype(str).astype(object))
+        set_col(rocket, IDX_I_R_QTY, rng.integers(0, 500, len(part)).astype(str).astype(object))
+        paths['inv'].append(write(rocket, os.path.join(out_dir, f"rocket_{i}"), file_format(fmt, i), encoding))
+    for i, part in enumerate(np.array_split(rng.permutation(n_sku), files)):
+        jifeng = blank_frame(len(part), IDX_I_J_QTY + 1, {IDX_I_J_BAR: '条码', IDX_I_J_QTY: '可用库存'})
+        set_col(jifeng, IDX_I_J_BAR, barcodes[part])
+        set_col(jifeng, IDX_I_J_QTY, rng.integers(0, 500, len(part)).astype(str).astype(object))
+        paths['inv_j'].append(write(jifeng, os.path.join(out_dir, f"jifeng_{i}"), file_format(fmt, i + 1), encoding))
+    return paths
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="生成 Coupang 格式的合成测试数据")
+    parser.add_argument('--skus', type=int, default=10_000, help="SKU 数量")
+    parser.add_argument('--files', type=int, default=3, help="每组文件数 (销售 / 广告 / 火箭仓 / 极风)")
+    parser.add_argument('--format', choices=FORMATS, default='csv', help="文件格式 (mixed 为 csv / xlsx 交替)")
+    parser.add_argument('--encoding', choices=ENCODINGS, default='utf-8', help="CSV 编码")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('-o', '--out', required=True, help="输出目录")
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    paths = generate(args.out, args.skus, args.files, args.format, args.encoding, args.seed)
+    for group, files in paths.items():
+        print(group, files)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,100 @@
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from engine import available_backends, combine_clean, compute_report, filter_sheets, merge_tables
+from gen_data import generate
+from ingest import load_inputs
+from parse_cache import ParseCache
+
+# ==========================================
+# 计算引擎一致性检查: pandas 版 (参照) 与 DuckDB 版的结果必须逐位相同 (含 dtype)
+# 1) 合成文件走完整流水线，比较三张报表 (DuckDB 另外从解析缓存的 Parquet 文件直接扫描一次)
+# 2) 大量广告行 / 小数利润 / 小数销量的清洗结果直接比较 df_final (累加误差、.5 取整边界)，覆盖多个线程数
+# 用法: python benchmarks/parity_backends.py --sizes 1000 10000 --threads 1 4
+# 未安装 duckdb 时跳过并返回 0
+# ==========================================
+
+# 比较 df_final 中 merge_tables 算出的列
+MERGED_COLUMNS = [
+    'SKU销量', '火箭仓库存', '极风库存', 'P列_SKU总毛利', 'Q列_产品总利润', '产品总销量',
+    '产品_火箭仓库存', '产品_极风库存', 'R列_产品总广告费', '产品广告销量', 'S列_最终净利润',
+]
+
+def check_reports(n_sku, data_dir):
+    paths = generate(data_dir, n_sku, 2, 'mixed', 'utf-8')
+    files = (paths['master'], paths['sales'], paths['ads'], paths['inv'], paths['inv_j'])
+    cache = ParseCache(os.path.join(data_dir, 'cache'))
+    inputs = load_inputs(*files, cache=cache, workers=1)
+    expected = filter_sheets(*compute_report(*inputs))
+    scanned = load_inputs(*files, cache=cache, workers=1, parquet=True)
+    assert all(isinstance(part, str) for parts in scanned[1:] for part in parts), "缓存命中的文件应以 Parquet 路径返回"
+    for label, args in (('内存', inputs), ('Parquet', scanned)):
+        got = filter_sheets(*compute_report(*args, backend='duckdb'))
+        for name, a, b in zip(('利润分析', '业务报表', '库存分析'), expected, got):
+            pd.testing.assert_frame_equal(a, b, check_exact=True, obj=f"{n_sku} SKU / {label} / {name}")
+
+# 清洗结果: 每个产品编号对应大量广告行 (小数广告费)，利润带两位小数，销量含 0.5，部分编号为空
+# (报表检查中销量 / 利润均为整数，两者合起来覆盖 SUM 与按行号 fsum 两条路径)
+def synthetic_clean(n_sku, ads_per_code, seed=0):
+    rng = np.random.default_rng(seed)
+    n_prod = max(1, n_sku // 4)
+    codes = np.array([f"C{10000 + p}" for p in range(n_prod)] + [None], dtype=object)
+    sku = np.array([f"{7_000_000_000 + i}" for i in range(n_sku)], dtype=object)
+    master = pd.DataFrame({
+        '_MATCH_SKU': pd.array(sku, dtype='str'),
+        '_MATCH_BAR': pd.array([f"880{i:010d}" for i in range(n_sku)], dtype='str'),
+        '_MATCH_CODE': pd.array(codes[rng.integers(0, len(codes), n_sku)], dtype='str'),
+        '_VAL_PROFIT': rng.integers(-3_000_00, 12_000_00, n_sku) / 100,
+    })
+    n_sales, n_ads = n_sku * 5, n_prod * ads_per_code
+    sales = pd.DataFrame({
+        '_MATCH_SKU': pd.array(sku[rng.integers(0, n_sku, n_sales)], dtype='str'),
+        '销量': rng.integers(0, 60, n_sales) / 2,
+    })
+    ads = pd.DataFrame({
+        '_MATCH_CODE': pd.array(codes[rng.integers(0, len(codes), n_ads)], dtype='str'),
+        '含税广告费': rng.integers(0, 50_000, n_ads) * 1.1 / 3,
+        '广告销量': rng.integers(0, 5, n_ads).astype(float),
+    })
+    inv = pd.DataFrame({'_MATCH_SKU': master['_MATCH_SKU'], '火箭仓库存': rng.integers(0, 500, n_sku).astype(float)})
+    return master, sales, ads, inv, None
+
+def check_merge(n_sku, ads_per_code, threads):
+    from duckdb_engine import merge_tables_duckdb
+
+    master, sales, ads, inv, inv_j = synthetic_clean(n_sku, ads_per_code)
+    expected = merge_tables(master, *(combine_clean(df, kind) for df, kind in ((sales, 'sales'), (ads, 'ads'), (inv, 'inv'), (inv_j, 'inv_j'))))
+    for n in threads:
+        got = merge_tables_duckdb(master, sales, ads, inv, inv_j, threads=n)
+        pd.testing.assert_frame_equal(expected[MERGED_COLUMNS], got[MERGED_COLUMNS], check_exact=True, obj=f"{n_sku} SKU / threads={n}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="pandas / DuckDB 计算引擎结果一致性检查")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1_000, 10_000], help="SKU 数量")
+    parser.add_argument('--ads-per-code', type=int, default=200, help="合成清洗结果中每个产品编号的广告行数")
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, 4], help="DuckDB 线程数")
+    args = parser.parse_args(argv)
+
+    if 'duckdb' not in available_backends():
+        print("未安装 duckdb，跳过")
+        return 0
+    tmp = tempfile.mkdtemp(prefix='coupang_parity_')
+    try:
+        for n_sku in args.sizes:
+            check_reports(n_sku, os.path.join(tmp, str(n_sku)))
+            check_merge(n_sku, args.ads_per_code, args.threads)
+            print(f"{n_sku:,} SKU: pandas == duckdb (报表: 内存 / Parquet 扫描, 合并结果: 线程数 {', '.join(map(str, args.threads))})")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,99 @@
+import argparse
+import glob
+import sys
+import time
+
+from agg_store import DEFAULT_STORE_PATH, AggregateStore
+from batch import export_shops
+from engine import BACKENDS, PROFIT_ALL, PROFIT_NEG, PROFIT_POS, available_backends, compute_report, filter_sheets
+from export import export_excel
+from ingest import DEFAULT_WORKERS, load_inputs
+from instrument import StageRecorder, stage
+from parse_cache import DEFAULT_CACHE_DIR, ParseCache
+
+# ==========================================
+# 命令行入口: 不启动 Streamlit，直接生成 Excel 报表
+# 用法示例:
+#   python cli.py --master master.xlsx --sales "sales/*.xlsx" --ads "ads/*.csv" \
+#                 --inv "rocket/*.xlsx" --inv-j "jifeng/*.csv" -o report.xlsx
+# ==========================================
+
+PROFIT_CHOICES = {'all': PROFIT_ALL, 'pos': PROFIT_POS, 'neg': PROFIT_NEG}
+
+# 展开路径 / 通配符 (保持输入顺序, 同一通配符内按文件名排序)
+def expand_paths(patterns):
+    paths = []
+    for pattern in patterns or []:
+        matched = sorted(glob.glob(pattern))
+        if not matched:
+            raise FileNotFoundError(f"未找到匹配文件: {pattern}")
+        paths.extend(matched)
+    return paths
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Coupang 经营报表 (命令行版)")
+    parser.add_argument('--master', required=True, help="1. 基础信息表 (Master)")
+    parser.add_argument('--sales', nargs='*', default=[], help="2. 销售表 (路径或通配符，可多个)")
+    parser.add_argument('--ads', nargs='*', default=[], help="3. 广告表 (路径或通配符，可多个)")
+    parser.add_argument('--inv', nargs='*', default=[], help="4. 库存信息表 (火箭仓 Rocket)")
+    parser.add_argument('--inv-j', nargs='*', default=[], help="5. 库存信息表 (极风OMS)")
+    parser.add_argument('--code', default='', help="产品编号 / SKU ID / 条码 / 店铺 前缀检索，多个用逗号分隔 (如 C123,C456)")
+    parser.add_argument('--profit', choices=sorted(PROFIT_CHOICES), default='all', help="利润筛选: all / pos / neg")
+    parser.add_argument('-o', '--output', required=True, help="输出 xlsx 路径 (--by-shop 时为 zip 路径)")
+    parser.add_argument('--by-shop', action='store_true', help="按登品店铺拆分，每个店铺一个 xlsx，打包为 zip")
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR, help="解析缓存目录")
+    parser.add_argument('--no-cache', action='store_true', help="不使用解析缓存")
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help="并行读取的进程/线程数 (1 为串行)")
+    parser.add_argument('--stream', action='store_true', help="销售表 / 广告表流式汇总 (超大文件省内存)")
+    parser.add_argument('--backend', choices=BACKENDS, default='pandas', help="计算引擎 (duckdb 需 pip install duckdb)")
+    parser.add_argument('--store', nargs='?', const=DEFAULT_STORE_PATH, default=None, help="增量汇总库 (SQLite)，销售表 / 广告表部分和入库后不再重复解析")
+    parser.add_argument('--timings', metavar='PATH', help="各阶段耗时 / 内存以 JSON lines 追加写入 PATH ('-' 为标准输出)")
+    parser.add_argument('--store-all', action='store_true', help="同时合并汇总库中全部已入库的销售表 / 广告表")
+    return parser
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.store_all and args.store is None:
+        parser.error("--store-all 需要同时指定 --store")
+    if not args.store_all and not (args.sales and args.ads):
+        parser.error("必须提供 --sales 与 --ads (或使用 --store --store-all 合并已入库文件)")
+    if args.backend not in available_backends():
+        parser.error(f"计算引擎 {args.backend} 不可用 (pip install {args.backend})")
+    t0 = time.perf_counter()
+
+    filters = dict(filter_code=args.code.strip().upper(), filter_profit=PROFIT_CHOICES[args.profit])
+    cache = None if args.no_cache else ParseCache(args.cache_dir)
+    store = AggregateStore(args.store) if args.store else None
+    stored = {kind: store.files(kind)['file_hash'].tolist() for kind in ('sales', 'ads')} if args.store_all else None
+    recorder = StageRecorder()
+    with recorder.activate():
+        inputs = load_inputs(
+            args.master,
+            expand_paths(args.sales),
+            expand_paths(args.ads),
+            expand_paths(args.inv),
+            expand_paths(args.inv_j),
+            cache=cache, workers=args.workers, stream=args.stream, store=store, stored=stored,
+            parquet=args.backend == 'duckdb',
+        )
+        sheets = compute_report(*inputs, backend=args.backend)
+        if args.by_shop:
+            shops = export_shops(sheets, args.output, workers=args.workers, **filters)
+        else:
+            with stage('filter_sheets', rows=len(sheets[0])):
+                df_final_clean, df_sheet2, df_sheet3 = filter_sheets(*sheets, **filters)
+            export_excel(df_final_clean, df_sheet2, df_sheet3, args.output)
+    if args.timings:
+        recorder.write_jsonl(args.timings, output=args.output, workers=args.workers, stream=args.stream, backend=args.backend)
+
+    if args.by_shop:
+        for shop, n_sku, n_prod in shops:
+            print(f"  {shop}: SKU {n_sku} / 产品 {n_prod}")
+        print(f"✅ {args.output}: {len(shops)} 个店铺 ({time.perf_counter() - t0:.2f}s)")
+    else:
+        print(f"✅ {args.output}: SKU {len(df_final_clean)} / 产品 {len(df_sheet2)} ({time.perf_counter() - t0:.2f}s)")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
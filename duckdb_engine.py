@@ -0,0 +1,152 @@
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from engine import CLEAN_COLUMNS, MATCH_KEYS, combine_clean
+
+# ==========================================
+# DuckDB 计算引擎 (可选): Step 5 的分表汇总 + 星型关联 + 产品级汇总作为一个查询执行 (多线程、列式)
+# 清洗规则与 pandas 版共用 (engine 的 clean_* / 解析缓存 / 流式 / 汇总库的结果都可直接输入)，
+# 命中解析缓存的销售 / 广告 / 库存表以 Parquet 路径传入，由 read_parquet 直接扫描 (不读入 pandas，由 DuckDB 管理内存，可溢写磁盘)；
+# 主表 (需保留原始列输出) 与结果仍在 pandas 中
+# 输出与 engine.merge_tables 相同的 df_final (逐位一致)，之后的报表构造不变；pandas 版仍为参照实现
+# ==========================================
+
+# 与 merge_tables 的语义一致:
+# - 匹配键用 IS NOT DISTINCT FROM 关联 (空键与空键匹配，同 factorize(use_na_sentinel=False))
+# - 销量 / 库存汇总后截断取整 (同 astype(int))，广告费四舍六入五成双 (同 numpy round)
+# - 产品级汇总按 _MATCH_CODE 分组 (空编号为一组)
+# - 浮点求和逐位一致、与线程数无关: 含小数的列用 fsum (Kahan 求和，同 pandas groupby.sum) 按原始行号顺序累加，
+#   全为整数的列 (销量 / 库存，整数利润时的毛利) 任意顺序求和都精确，直接 SUM (按行号排序的聚合较慢)
+MERGE_SQL = '''
+WITH
+m AS (
+    SELECT _row, CAST(_MATCH_SKU AS VARCHAR) AS sku, CAST(_MATCH_BAR AS VARCHAR) AS bar,
+           CAST(_MATCH_CODE AS VARCHAR) AS code, CAST(_VAL_PROFIT AS DOUBLE) AS profit
+    FROM master
+),
+s AS (SELECT CAST(_MATCH_SKU AS VARCHAR) AS k, {sales} AS v FROM sales GROUP BY 1),
+i AS (SELECT CAST(_MATCH_SKU AS VARCHAR) AS k, {inv} AS v FROM inv GROUP BY 1),
+j AS (SELECT CAST(_MATCH_BAR AS VARCHAR) AS k, {inv_j} AS v FROM inv_j GROUP BY 1),
+a AS (
+    SELECT CAST(_MATCH_CODE AS VARCHAR) AS k, {spend} AS spend, {ad_qty} AS qty
+    FROM ads GROUP BY 1
+),
+sku AS (
+    SELECT m._row, m.code,
+           CAST(trunc(COALESCE(s.v, 0)) AS BIGINT) AS qty,
+           CAST(trunc(COALESCE(i.v, 0)) AS BIGINT) AS rocket,
+           CAST(trunc(COALESCE(j.v, 0)) AS BIGINT) AS jifeng,
+           CAST(trunc(COALESCE(s.v, 0)) AS BIGINT) * m.profit AS gross
+    FROM m
+    LEFT JOIN s ON m.sku IS NOT DISTINCT FROM s.k
+    LEFT JOIN i ON m.sku IS NOT DISTINCT FROM i.k
+    LEFT JOIN j ON m.bar IS NOT DISTINCT FROM j.k
+),
+p AS (
+    SELECT code,
+           {gross} AS prod_gross,
+           CAST(SUM(qty) AS BIGINT) AS prod_qty,
+           CAST(SUM(rocket) AS BIGINT) AS prod_rocket,
+           CAST(SUM(jifeng) AS BIGINT) AS prod_jifeng
+    FROM sku GROUP BY 1
+)
+SELECT sku.qty, sku.rocket, sku.jifeng, sku.gross,
+       p.prod_gross, p.prod_qty, p.prod_rocket, p.prod_jifeng,
+       CAST(round_even(COALESCE(a.spend, 0), 0) AS BIGINT) AS ad_spend,
+       CAST(COALESCE(a.qty, 0) AS DOUBLE) AS ad_qty
+FROM sku
+JOIN p ON sku.code IS NOT DISTINCT FROM p.code
+LEFT JOIN a ON sku.code IS NOT DISTINCT FROM a.k
+ORDER BY sku._row
+'''
+
+# 查询结果列 -> df_final 列 (顺序与 merge_tables 相同)
+RESULT_COLUMNS = [
+    ('qty', 'SKU销量'),
+    ('rocket', '火箭仓库存'),
+    ('jifeng', '极风库存'),
+    ('gross', 'P列_SKU总毛利'),
+    ('prod_gross', 'Q列_产品总利润'),
+    ('prod_qty', '产品总销量'),
+    ('prod_rocket', '产品_火箭仓库存'),
+    ('prod_jifeng', '产品_极风库存'),
+    ('ad_spend', 'R列_产品总广告费'),
+    ('ad_qty', '产品广告销量'),
+]
+
+# 每个部分 (文件) 的行号占高位，_row 为「部分序号, 部分内行号」，排序与 pandas 按上传顺序合并后的行号一致
+PART_SHIFT = 40
+
+def _literal(value):
+    return "'" + str(value).replace("'", "''") + "'"
+
+# 把一类清洗结果 (DataFrame / Parquet 路径 / 列表 / None) 注册为视图 kind (清洗列 + _row)
+# Parquet 路径 (解析缓存文件) 由 read_parquet 直接扫描，不经过 pandas；DataFrame 以 Arrow 表注册
+def register_source(con, kind, clean):
+    parts = [clean] if clean is None or isinstance(clean, (pd.DataFrame, str)) else list(clean)
+    parts = [part for part in parts if part is not None] or [combine_clean(None, kind)]
+    cols = ', '.join(f'"{c}"' for c in CLEAN_COLUMNS[kind])
+    selects = []
+    for n, part in enumerate(parts):
+        offset = n << PART_SHIFT
+        if isinstance(part, str):
+            selects.append(f"SELECT {cols}, {offset} + file_row_number AS _row FROM read_parquet({_literal(part)}, file_row_number = true)")
+            continue
+        # Arrow 字符串列零拷贝；空表 (无文件) 的键列为 object，显式指定为字符串
+        df = part[CLEAN_COLUMNS[kind]]
+        table = pa.Table.from_pandas(df.astype({MATCH_KEYS[kind]: 'str'}) if df.empty else df, preserve_index=False)
+        con.register(f"{kind}_{n}", table.append_column('_row', pa.array(np.arange(offset, offset + len(df), dtype=np.int64))))
+        selects.append(f"SELECT {cols}, _row FROM {kind}_{n}")
+    con.execute(f"CREATE TEMP VIEW {kind} AS {' UNION ALL '.join(selects)}")
+
+# 求和表达式: 全为整数 (且不会超出浮点整数精度) 时直接 SUM，否则按行号顺序 fsum
+def sum_expr(column, integral):
+    return f'SUM({column})' if integral else f'fsum({column} ORDER BY _row)'
+
+def is_integral(values):
+    values = np.asarray(values, dtype=float)
+    return bool(np.array_equal(values, np.trunc(values)) and np.abs(values).sum() < 2 ** 53)
+
+# 视图中某列是否全为整数 (在 DuckDB 中扫描判断，Parquet 文件不读入 pandas)
+def is_integral_sql(con, kind, column):
+    integral, total = con.execute(f'SELECT bool_and("{column}" = trunc("{column}")), SUM(abs("{column}")) FROM {kind}').fetchone()
+    return integral is not False and (total or 0) < 2 ** 53
+
+# Step 5 (DuckDB 版): 参数与返回值同 engine.merge_tables，各清洗结果可为 DataFrame / Parquet 路径 / 列表 / None
+# 主表只把匹配键与单件利润送入查询，原始列留在 pandas 中
+def merge_tables_duckdb(df_calc, sales, ads, inv, inv_j, threads=None):
+    import duckdb
+
+    df_final = df_calc.reset_index(drop=True)
+    master = pd.DataFrame({
+        '_row': range(len(df_final)),
+        **{col: df_final[col] for col in ('_MATCH_SKU', '_MATCH_BAR', '_MATCH_CODE', '_VAL_PROFIT')},
+    })
+    with duckdb.connect() as con:
+        # 溢写目录放在系统临时目录 (内存数据库默认写到当前目录下的 .tmp)
+        con.execute(f"SET temp_directory = {_literal(os.path.join(tempfile.gettempdir(), 'coupang_duckdb'))}")
+        if threads:
+            con.execute(f"SET threads = {int(threads)}")
+        con.register('master', pa.Table.from_pandas(master, preserve_index=False))
+        for kind, clean in (('sales', sales), ('ads', ads), ('inv', inv), ('inv_j', inv_j)):
+            register_source(con, kind, clean)
+        result = con.execute(MERGE_SQL.format(
+            sales=sum_expr('"销量"', is_integral_sql(con, 'sales', '销量')),
+            inv=sum_expr('"火箭仓库存"', is_integral_sql(con, 'inv', '火箭仓库存')),
+            inv_j=sum_expr('"极风库存"', is_integral_sql(con, 'inv_j', '极风库存')),
+            spend=sum_expr('"含税广告费"', is_integral_sql(con, 'ads', '含税广告费')),
+            ad_qty=sum_expr('"广告销量"', is_integral_sql(con, 'ads', '广告销量')),
+            gross=sum_expr('gross', is_integral(master['_VAL_PROFIT'])),
+        )).df()
+
+    # 毛利列的类型跟随单件利润 (整数利润时 pandas 版为整数)
+    gross_dtype = np.result_type(np.int64, df_final['_VAL_PROFIT'].dtype)
+    for src, target in RESULT_COLUMNS:
+        values = result[src].to_numpy()
+        df_final[target] = values.astype(gross_dtype) if src in ('gross', 'prod_gross') else values
+    df_final['S列_最终净利润'] = df_final['Q列_产品总利润'] - df_final['R列_产品总广告费']
+    return df_final
@@ -0,0 +1,685 @@
+import codecs
+import collections
+import importlib.util
+import io
+import os
+import re
+import numpy as np
+import pandas as pd
+from openpyxl.utils import get_column_letter
+
+from instrument import stage
+
+# ==========================================
+# 1. 列号配置
+# ==========================================
+IDX_M_CODE   = 0    # A列
+IDX_M_SHOP   = 1    # B列: 登品店铺
+IDX_M_SKU    = 3    # D列
+IDX_M_COST   = 6    # G列
+IDX_M_PROFIT = 10   # K列
+IDX_M_BAR    = 12   # M列
+
+IDX_S_ID     = 0    # A列
+IDX_S_QTY    = 8    # I列
+
+IDX_A_CAMPAIGN = 5  # F列
+IDX_A_GROUP    = 6  # G列
+IDX_A_SPEND    = 15 # P列
+IDX_A_SALES    = 29 # AD列
+
+IDX_I_R_ID   = 2    # C列
+IDX_I_R_QTY  = 7    # H列
+
+IDX_I_J_BAR  = 2    # C列
+IDX_I_J_QTY  = 10   # K列
+
+# --- 列映射: 每类文件的字段 (表头别名, 默认列号, 类型) ---
+# 读取时先只读表头行按别名定位各字段 (不区分大小写 / 空格)，找不到别名时退回上面的默认列号
+# 类型: key 匹配键 / number 数字 (抽样校验) / text 文本
+Field = collections.namedtuple('Field', ['name', 'aliases', 'index', 'dtype'])
+SCHEMAS = {
+    'master': [
+        Field('产品编号', ('产品编号', '商品编号', 'product code'), IDX_M_CODE, 'text'),
+        Field('登品店铺', ('登品店铺', '店铺', 'shop'), IDX_M_SHOP, 'text'),
+        Field('SKU ID', ('sku id', '옵션id', 'option id'), IDX_M_SKU, 'key'),
+        Field('成本', ('成本', '采购成本', 'cost'), IDX_M_COST, 'number'),
+        Field('利润', ('利润', '单件利润', 'profit'), IDX_M_PROFIT, 'number'),
+        Field('条码', ('条码', '条形码', '바코드', 'barcode'), IDX_M_BAR, 'key'),
+    ],
+    'sales': [
+        Field('注册商品ID', ('注册商品id', '옵션id', 'sku id', 'option id'), IDX_S_ID, 'key'),
+        Field('销量', ('销量', '판매량', '판매수량', 'sales qty', 'quantity'), IDX_S_QTY, 'number'),
+    ],
+    'ads': [
+        Field('广告活动', ('广告活动', '캠페인명', 'campaign'), IDX_A_CAMPAIGN, 'text'),
+        Field('广告组', ('广告组', '광고그룹', 'ad group'), IDX_A_GROUP, 'text'),
+        Field('广告费', ('广告费', '광고비', 'ad spend', 'spend'), IDX_A_SPEND, 'number'),
+        Field('广告销量', ('广告销量', '총판매수량(14일)', '총판매수량', 'ad sales'), IDX_A_SALES, 'number'),
+    ],
+    'inv': [
+        Field('SKU ID', ('sku id', '옵션id'), IDX_I_R_ID, 'key'),
+        Field('可售库存', ('可售库存', '판매가능재고', 'available stock'), IDX_I_R_QTY, 'number'),
+    ],
+    'inv_j': [
+        Field('条码', ('条码', '商品条码', '바코드', 'barcode'), IDX_I_J_BAR, 'key'),
+        Field('可用库存', ('可用库存', '极风库存', 'available stock'), IDX_I_J_QTY, 'number'),
+    ],
+}
+
+# --- 利润筛选选项 ---
+PROFIT_ALL = "全部显示"
+PROFIT_POS = "只看盈利 (>0)"
+PROFIT_NEG = "只看亏损 (<0)"
+PROFIT_OPTIONS = (PROFIT_ALL, PROFIT_POS, PROFIT_NEG)
+
+# ==========================================
+# 2. 清洗 / 读取函数
+# ==========================================
+
+# 清洗匹配键
+def clean_for_match(series):
+    return series.astype(str).str.replace(r'\.0$', '', regex=True).str.replace('"', '').str.strip().str.upper()
+
+# 清洗数字
+def clean_num(series):
+    return pd.to_numeric(series.astype(str).str.replace(',', ''), errors='coerce').fillna(0)
+
+# 产品编号格式 (如 C123 / c123)
+CODE_PATTERN = re.compile(r'([Cc]\d+)')
+
+# 提取编号
+def extract_code_from_text(text):
+    if pd.isna(text): return None
+    match = CODE_PATTERN.search(str(text))
+    if match: return match.group(1).upper()
+    return None
+
+# 批量提取编号: 先对去重后的文本做 str.extract，再按位置映射回每一行
+# 广告组 / 广告活动名称大量重复，耗时与不同名称数成正比而非行数
+def extract_codes(series):
+    positions, uniques = pd.factorize(series)
+    extracted = pd.Series(uniques, dtype=object).astype(str).str.extract(CODE_PATTERN, expand=False).str.upper()
+    values = np.append(extracted.to_numpy(dtype=object), None)  # 缺失值 (-1) 映射到末尾的 None
+    values[pd.isna(values)] = None
+    return pd.Series(values[positions], index=series.index, dtype=object)
+
+# xlsx 解析引擎: 安装了 python-calamine 时使用 (比 openpyxl 快数倍)
+EXCEL_ENGINE = 'calamine' if importlib.util.find_spec('python_calamine') else 'openpyxl'
+
+# 读取文件原始字节 (Streamlit 上传对象 / 文件对象 / 本地路径)
+def read_bytes(file):
+    if hasattr(file, 'getvalue'):
+        return file.getvalue()
+    if hasattr(file, 'read'):
+        file.seek(0)
+        data = file.read()
+        file.seek(0)
+        return data
+    with open(file, 'rb') as f:
+        return f.read()
+
+# 判断 CSV 编码: 能按 UTF-8 完整解码则为 UTF-8，否则按 GBK
+def sniff_encoding(data):
+    if data.startswith(codecs.BOM_UTF8):
+        return 'utf-8-sig'
+    try:
+        data.decode('utf-8')
+        return 'utf-8'
+    except UnicodeDecodeError:
+        return 'gbk'
+
+# 单元格转字符串，与 pd.read_excel(dtype=str) 保持一致 (整数值浮点数去掉 .0，空单元格为 NaN)
+def cell_str(value):
+    if value is None: return np.nan
+    if isinstance(value, float) and value.is_integer(): return str(int(value))
+    return str(value)
+
+# 按原始列号取列: 投影读取的 DataFrame 以原始列号为列名 (attrs['projected'])
+def column(df, idx):
+    if df.attrs.get('projected'):
+        return df[idx]
+    return df.iloc[:, idx]
+
+# 读取文件 (支持 Streamlit 上传对象 / 本地路径)
+# 按文件内容判断格式 (xlsx/xlsm 为 zip 包，其余按 CSV 处理)，CSV 编码预先识别
+# usecols: 只读取指定列号；若不是从 A 列开始的连续列，结果以原始列号为列名，需通过 column() 取列
+def read_file_fast(file, usecols=None):
+    data = read_bytes(file)
+    buf = io.BytesIO(data)
+    if data[:4] == b'PK\x03\x04':
+        df = pd.read_excel(buf, dtype=str, engine=EXCEL_ENGINE, usecols=usecols)
+    else:
+        df = pd.read_csv(buf, dtype=str, encoding=sniff_encoding(data), usecols=usecols)
+    usecols = sorted(usecols) if usecols is not None else None
+    if usecols is not None and usecols != list(range(len(usecols))):
+        df.columns = usecols
+        df.attrs['projected'] = True
+    return df
+
+# 读取完整文件 (所有列)
+def read_file_strict(file):
+    return read_file_fast(file)
+
+# 读取多个文件并合并 (空列表返回 None)
+def read_files(files):
+    frames = [read_file_strict(f) for f in files or []]
+    return concat_frames(frames)
+
+# 合并多个 DataFrame，也接受单个 DataFrame / None；列表中的字符串为清洗结果的 Parquet 路径 (解析缓存文件)
+def concat_frames(frames):
+    if frames is None or isinstance(frames, pd.DataFrame):
+        return frames
+    frames = [pd.read_parquet(f) if isinstance(f, str) else f for f in frames]
+    if not frames:
+        return None
+    return pd.concat(frames, ignore_index=True)
+
+# ==========================================
+# 3. 分表聚合 (Step 1-4)
+# ==========================================
+
+# Step 1: 基础信息表 -> 原始列 + 匹配键 + 数值列
+def prepare_master(df_master):
+    df_calc = df_master.copy()
+    df_calc['_MATCH_SKU'] = clean_for_match(column(df_calc, IDX_M_SKU))
+    df_calc['_MATCH_BAR'] = clean_for_match(column(df_calc, IDX_M_BAR))
+    df_calc['_MATCH_CODE'] = clean_for_match(column(df_calc, IDX_M_CODE))
+    df_calc['_VAL_PROFIT'] = clean_num(column(df_calc, IDX_M_PROFIT))
+    df_calc['_VAL_COST'] = clean_num(column(df_calc, IDX_M_COST))
+    df_calc['_MATCH_SHOP'] = column(df_calc, IDX_M_SHOP).astype(str).str.strip()
+    return df_calc
+
+# Step 2: 销售表 -> [_MATCH_SKU, 销量]
+def clean_sales(df_sales):
+    return pd.DataFrame({
+        '_MATCH_SKU': clean_for_match(column(df_sales, IDX_S_ID)),
+        '销量': clean_num(column(df_sales, IDX_S_QTY)),
+    })
+
+# Step 3: 广告表 -> [_MATCH_CODE, 含税广告费, 广告销量] (去掉无法识别编号的行)
+def clean_ads(df_ads):
+    df_ads_all = pd.DataFrame({
+        '含税广告费': clean_num(column(df_ads, IDX_A_SPEND)) * 1.1,
+        '广告销量': clean_num(column(df_ads, IDX_A_SALES)),
+    })
+    code_group = extract_codes(column(df_ads, IDX_A_GROUP))
+    code_campaign = extract_codes(column(df_ads, IDX_A_CAMPAIGN))
+    df_ads_all.insert(0, '_MATCH_CODE', code_group.fillna(code_campaign))
+    return df_ads_all.dropna(subset=['_MATCH_CODE']).reset_index(drop=True)
+
+# Step 4a: 火箭仓库存 -> [_MATCH_SKU, 火箭仓库存]
+def clean_inv(df_inv):
+    return pd.DataFrame({
+        '_MATCH_SKU': clean_for_match(column(df_inv, IDX_I_R_ID)),
+        '火箭仓库存': clean_num(column(df_inv, IDX_I_R_QTY)),
+    })
+
+# Step 4b: 极风库存 -> [_MATCH_BAR, 极风库存]
+def clean_inv_j(df_inv_j):
+    return pd.DataFrame({
+        '_MATCH_BAR': clean_for_match(column(df_inv_j, IDX_I_J_BAR)),
+        '极风库存': clean_num(column(df_inv_j, IDX_I_J_QTY)),
+    })
+
+# 报表保留的基础信息表列数 (A-M 列)
+MASTER_COLUMNS = 13
+
+# 各类文件的清洗函数及其依赖的列号 (列号变化时缓存自动失效)
+CLEANERS = {
+    'master': (prepare_master, (IDX_M_CODE, IDX_M_SHOP, IDX_M_SKU, IDX_M_COST, IDX_M_PROFIT, IDX_M_BAR)),
+    'sales': (clean_sales, (IDX_S_ID, IDX_S_QTY)),
+    'ads': (clean_ads, (IDX_A_CAMPAIGN, IDX_A_GROUP, IDX_A_SPEND, IDX_A_SALES)),
+    'inv': (clean_inv, (IDX_I_R_ID, IDX_I_R_QTY)),
+    'inv_j': (clean_inv_j, (IDX_I_J_BAR, IDX_I_J_QTY)),
+}
+
+# 各类文件需要读取的列号 (基础信息表保留 A-M 列原样输出，其余只读清洗用到的列)
+def read_columns(kind):
+    if kind == 'master':
+        return list(range(MASTER_COLUMNS))
+    _, columns = CLEANERS[kind]
+    return sorted(set(columns))
+
+# ==========================================
+# 列映射解析: 只读表头 + 少量样本行，定位字段并校验 (在完整读取之前失败)
+# ==========================================
+
+SAMPLE_ROWS = 50
+
+class SchemaError(ValueError):
+    pass
+
+# 列映射结果: positions 为 {默认列号: 实际列号}，fallbacks 为按默认列号定位的字段名
+ColumnMap = collections.namedtuple('ColumnMap', ['kind', 'positions', 'n_columns', 'fallbacks'])
+
+def normalize_header(header):
+    return re.sub(r'\s+', '', str(header)).lower()
+
+# CSV 编码 (只看文件开头，末尾不完整的多字节字符不算错误)
+def sniff_head_encoding(data):
+    if data.startswith(codecs.BOM_UTF8):
+        return 'utf-8-sig'
+    try:
+        codecs.getincrementaldecoder('utf-8')().decode(data, final=False)
+        return 'utf-8'
+    except UnicodeDecodeError:
+        return 'gbk'
+
+# 读取表头 + 前 n_rows 行 (xlsx 与完整读取使用同一引擎，calamine 下不经过 openpyxl 解析共享字符串表)
+# 本地路径的 CSV 只读文件开头，不把整个文件读入内存
+def read_head(file, n_rows=SAMPLE_ROWS):
+    if isinstance(file, (str, os.PathLike)):
+        with open(file, 'rb') as f:
+            head = f.read(1 << 20)
+        source = file
+    else:
+        data = read_bytes(file)
+        head, source = data[:1 << 20], io.BytesIO(data)
+    if head[:4] == b'PK\x03\x04':
+        return pd.read_excel(source, dtype=str, nrows=n_rows, engine=EXCEL_ENGINE)
+    return pd.read_csv(io.BytesIO(head), dtype=str, nrows=n_rows, encoding=sniff_head_encoding(head), encoding_errors='ignore')
+
+def _file_label(file):
+    return str(getattr(file, 'name', file))
+
+# 样本列中的非空值 (去掉首尾空白)
+def _sample(head, col):
+    values = head.iloc[:, col].dropna().astype(str).str.strip()
+    return values[values != '']
+
+# 解析列映射并校验: 缺少字段 / 多个字段指向同一列 / 数字列样本不是数字 时抛出 SchemaError
+def resolve_columns(file, kind):
+    head = read_head(file)
+    headers = [normalize_header(h) for h in head.columns]
+    n_columns = len(headers)
+    label = _file_label(file)
+    fields = SCHEMAS[kind]
+
+    positions, fallbacks = {}, []
+    matches, claimed = {}, {}
+    for field in fields:
+        aliases = {normalize_header(a) for a in field.aliases}
+        matches[field.name] = [i for i, h in enumerate(headers) if h in aliases]
+        for i in matches[field.name]:
+            claimed.setdefault(i, field)
+
+    # 表头匹配到其他列时: 默认列仍有数据、不属于其他字段且内容不同，则无法判断哪一列正确 (别名误匹配)，报错而不是静默改用
+    for field in fields:
+        found = matches[field.name]
+        if field.index in found:
+            positions[field.index] = field.index
+        elif found:
+            col, default = found[0], field.index
+            if default < n_columns and claimed.get(default) is None and len(_sample(head, default)) \
+                    and not head.iloc[:, default].equals(head.iloc[:, col]):
+                raise SchemaError(
+                    f"{label}: 「{field.name}」列不明确: 表头匹配 {get_column_letter(col + 1)} 列「{head.columns[col]}」，"
+                    f"但默认的 {get_column_letter(default + 1)} 列「{head.columns[default]}」也有数据 (请修改表头或列顺序)"
+                )
+            positions[field.index] = col
+
+    for field in fields:
+        if field.index in positions: continue
+        if field.index >= n_columns:
+            raise SchemaError(f"{label}: 找不到「{field.name}」列 (表头: {', '.join(map(str, head.columns))})")
+        other = claimed.get(field.index)
+        if other is not None and other is not field:
+            raise SchemaError(f"{label}: 找不到「{field.name}」列，且默认的 {get_column_letter(field.index + 1)} 列是「{head.columns[field.index]}」")
+        positions[field.index] = field.index
+        fallbacks.append(field.name)
+
+    used = collections.Counter(positions.values())
+    for field in fields:
+        if used[positions[field.index]] > 1:
+            raise SchemaError(f"{label}: 多个字段都对应 {get_column_letter(positions[field.index] + 1)} 列「{head.columns[positions[field.index]]}」")
+
+    # 抽样校验: 按默认列号退回的键 / 数字列样本不能全空 (多半是列错位)，数字列样本大多须为数字
+    for field in fields:
+        if field.dtype == 'text': continue
+        col = positions[field.index]
+        values = _sample(head, col)
+        if not len(values):
+            if len(head) and field.name in fallbacks:
+                raise SchemaError(f"{label}: 找不到「{field.name}」列，默认的 {get_column_letter(col + 1)} 列「{head.columns[col]}」前 {len(head)} 行为空")
+            continue
+        if field.dtype == 'number' and pd.to_numeric(values.str.replace(',', ''), errors='coerce').notna().mean() < 0.5:
+            raise SchemaError(f"{label}: {get_column_letter(col + 1)} 列「{head.columns[col]}」应为数字 ({field.name})，样本: {', '.join(values.head(3))}")
+    return ColumnMap(kind, positions, n_columns, fallbacks)
+
+# 基础信息表列顺序: 只移动字段列 (放回默认列号)，其余列留在原位；
+# 字段移走后空出的位置由被字段占去位置的原列依次填入 (字段来自 M 列之后时，被占位置的原列不再输出)
+def master_order(cmap, width):
+    moved = {canonical: actual for canonical, actual in cmap.positions.items() if canonical != actual}
+    actuals = set(cmap.positions.values())
+    displaced = iter(c for c in sorted(moved) if c not in actuals)
+    order = list(range(width))
+    for canonical, actual in moved.items():
+        order[canonical] = actual
+    for i in range(width):
+        if i in actuals and i not in cmap.positions:
+            order[i] = next(displaced)
+    return order
+
+# 按列映射读取 (只读需要的列)，结果统一为默认列布局，清洗函数无需关心实际列位置
+def read_mapped(file, cmap):
+    if cmap.kind == 'master':
+        width = min(cmap.n_columns, max(MASTER_COLUMNS, max(cmap.positions.values()) + 1))
+        df = read_file_fast(file, usecols=list(range(width)))
+        order = master_order(cmap, width)
+        return df if order == list(range(width)) else df.iloc[:, order]
+    inverse = {actual: canonical for canonical, actual in cmap.positions.items()}
+    usecols = sorted(inverse)
+    df = read_file_fast(file, usecols=usecols)
+    df.columns = [inverse[i] for i in usecols]
+    df.attrs['projected'] = True
+    return df
+
+# 读取并清洗单个文件 (先解析列映射，只读取需要的列)；cmap 可由调用方预先解析后传入
+def load_clean(file, kind, cmap=None):
+    cleaner, _ = CLEANERS[kind]
+    if cmap is None:
+        cmap = resolve_columns(file, kind)
+    with stage(f"parse:{kind}") as s:
+        df = read_mapped(file, cmap)
+        s['rows'] = len(df)
+    with stage(f"clean:{kind}") as s:
+        clean = cleaner(df)
+        s['rows'] = len(clean)
+    return clean
+
+# 各类清洗结果的匹配键与列
+MATCH_KEYS = {'sales': '_MATCH_SKU', 'ads': '_MATCH_CODE', 'inv': '_MATCH_SKU', 'inv_j': '_MATCH_BAR'}
+CLEAN_COLUMNS = {
+    'sales': ['_MATCH_SKU', '销量'],
+    'ads': ['_MATCH_CODE', '含税广告费', '广告销量'],
+    'inv': ['_MATCH_SKU', '火箭仓库存'],
+    'inv_j': ['_MATCH_BAR', '极风库存'],
+}
+
+# 合并同类清洗结果 (单个 DataFrame / 列表 / None)，无数据时返回空表
+def combine_clean(clean, kind):
+    df = concat_frames(clean)
+    if df is None:
+        return pd.DataFrame({col: pd.Series(dtype=object if col.startswith('_') else float) for col in CLEAN_COLUMNS[kind]})
+    return df
+
+# 按匹配键汇总清洗结果 (部分和)，列与清洗结果相同，每个键一行
+def partial_sums(clean, kind):
+    return combine_clean(clean, kind).groupby(MATCH_KEYS[kind], sort=False).sum().reset_index()
+
+# ==========================================
+# 4. 合并计算 + 报表构造 (Step 5-6)
+# ==========================================
+
+# 匹配键共享字典编码: 主表键与各清洗结果的键一起 factorize (一次哈希)，得到同一套整数编号
+# 主表排在最前，因此主表的键编号为 0..n_keys-1，其他表中 >= n_keys 的编号即主表中不存在的键
+# 返回 (主表键字典, 主表每行编号, [各表每行编号])
+def encode_keys(master_keys, *other_keys):
+    codes, uniques = pd.factorize(pd.concat([master_keys, *other_keys], ignore_index=True), use_na_sentinel=False)
+    bounds = np.cumsum([len(master_keys)] + [len(k) for k in other_keys])
+    parts = np.split(codes, bounds[:-1])
+    n_keys = int(parts[0].max()) + 1 if len(parts[0]) else 0
+    return uniques[:n_keys], parts[0], parts[1:]
+
+# 整数版「汇总 + 左连接」: 按编号分组求和，再按主表每行编号取值，未匹配的行为 0
+def sum_by_key(master_codes, codes, n_keys, values):
+    hit = codes < n_keys
+    sums = pd.Series(np.asarray(values, dtype=float)[hit]).groupby(codes[hit]).sum()
+    dense = np.zeros(n_keys, dtype=float)
+    dense[sums.index.to_numpy()] = sums.to_numpy()
+    return dense[master_codes]
+
+# 产品级汇总列: (结果列, 来源列)，按 _MATCH_CODE 一次分组全部算出
+PRODUCT_SUMS = [
+    ('Q列_产品总利润', 'P列_SKU总毛利'),
+    ('产品总销量', 'SKU销量'),
+    ('产品_火箭仓库存', '火箭仓库存'),
+    ('产品_极风库存', '极风库存'),
+]
+
+# Step 5: 主表关联各清洗结果 (按键汇总)，计算产品级利润
+# 匹配键编码为整数后，汇总、关联与产品级分组都在整数编号上完成 (不再逐表 merge / 按字符串 groupby)
+def merge_tables(df_calc, sales, ads, inv, inv_j):
+    df_final = df_calc.reset_index(drop=True)
+    sku_keys, sku_codes, (sales_codes, inv_codes) = encode_keys(df_final['_MATCH_SKU'], sales['_MATCH_SKU'], inv['_MATCH_SKU'])
+    bar_keys, bar_codes, (inv_j_codes,) = encode_keys(df_final['_MATCH_BAR'], inv_j['_MATCH_BAR'])
+    code_keys, code_codes, (ads_codes,) = encode_keys(df_final['_MATCH_CODE'], ads['_MATCH_CODE'])
+
+    df_final['SKU销量'] = sum_by_key(sku_codes, sales_codes, len(sku_keys), sales['销量']).astype(int)
+    df_final['火箭仓库存'] = sum_by_key(sku_codes, inv_codes, len(sku_keys), inv['火箭仓库存']).astype(int)
+    df_final['极风库存'] = sum_by_key(bar_codes, inv_j_codes, len(bar_keys), inv_j['极风库存']).astype(int)
+    df_final['P列_SKU总毛利'] = df_final['SKU销量'] * df_final['_VAL_PROFIT']
+
+    sources = [src for _, src in PRODUCT_SUMS]
+    product_sums = df_final[sources].groupby(code_codes).sum()
+    for target, src in PRODUCT_SUMS:
+        df_final[target] = product_sums[src].to_numpy()[code_codes]
+
+    df_final['R列_产品总广告费'] = sum_by_key(code_codes, ads_codes, len(code_keys), ads['含税广告费']).round(0).astype(int)
+    df_final['产品广告销量'] = sum_by_key(code_codes, ads_codes, len(code_keys), ads['广告销量'])
+    df_final['S列_最终净利润'] = df_final['Q列_产品总利润'] - df_final['R列_产品总广告费']
+    return df_final
+
+# 安全除法: 分母为 0 时结果为 0
+def safe_ratio(num, den):
+    num = np.asarray(num, dtype=float)
+    den = np.asarray(den, dtype=float)
+    return np.divide(num, den, out=np.zeros_like(num), where=den != 0)
+
+# 产品级比例指标 (业务报表)
+def add_product_metrics(df_sheet2):
+    df_sheet2['广告费占比'] = safe_ratio(df_sheet2['R列_产品总广告费'], df_sheet2['Q列_产品总利润'])
+    df_sheet2['自然销量'] = df_sheet2['产品总销量'] - df_sheet2['产品广告销量']
+    df_sheet2['自然销量占比'] = safe_ratio(df_sheet2['自然销量'], df_sheet2['产品总销量'])
+    return df_sheet2
+
+# SKU 级库存指标 (库存分析)
+def add_inventory_metrics(df_final):
+    df_final['火箭仓库存数量'] = df_final['火箭仓库存']
+    df_final['总库存'] = df_final['火箭仓库存数量'] + df_final['极风库存']
+    df_final['库存货值'] = df_final['总库存'] * df_final['_VAL_COST'] * 1.2
+    df_final['安全库存'] = df_final['SKU销量'] * 3
+    df_final['冗余标准'] = df_final['SKU销量'] * 8
+    # 待补数量: 总库存低于安全库存的差额
+    df_final['待补数量'] = (df_final['安全库存'] - df_final['总库存']).clip(lower=0)
+    # 滞销库存货值: 总库存达到冗余标准 (且两者不同时为 0) 时计入库存货值
+    total, redundant_std = df_final['总库存'], df_final['冗余标准']
+    is_dead = (total >= redundant_std) & ~((total == 0) & (redundant_std == 0))
+    df_final['滞销库存货值'] = np.where(is_dead, df_final['库存货值'], 0.0)
+    return df_final
+
+# Step 6: 构造三张报表 (利润分析 / 业务报表 / 库存分析)
+def build_sheets(df_final, cols_master_AM):
+    col_code_name = cols_master_AM[IDX_M_CODE]
+
+    # Sheet2 (业务报表)
+    df_final['产品_总库存'] = df_final['产品_火箭仓库存'] + df_final['产品_极风库存']
+
+    df_sheet2 = df_final[[col_code_name, '_MATCH_SHOP', 'Q列_产品总利润', 'R列_产品总广告费', 'S列_最终净利润', '产品总销量', '产品广告销量', '产品_火箭仓库存', '产品_极风库存', '产品_总库存']].copy()
+    df_sheet2 = df_sheet2.drop_duplicates(subset=[col_code_name], keep='first')
+
+    df_sheet2.rename(columns={
+        '_MATCH_SHOP': '登品店铺',
+        '产品_火箭仓库存': '火箭仓库存',
+        '产品_极风库存': '极风库存',
+        '产品_总库存': '总库存'
+    }, inplace=True)
+
+    with stage('metrics:product', rows=len(df_sheet2)):
+        add_product_metrics(df_sheet2)
+
+    cols_order_s2 = [
+        col_code_name, '登品店铺',
+        'Q列_产品总利润', 'R列_产品总广告费', 'S列_最终净利润',
+        '广告费占比', '自然销量占比',
+        '总库存',
+        '产品总销量', '产品广告销量', '自然销量', '自然销量占比',
+        '火箭仓库存', '极风库存'
+    ]
+    cols_order_s2 = list(dict.fromkeys(cols_order_s2))
+    df_sheet2 = df_sheet2[cols_order_s2]
+
+    # Sheet3 (库存分析)
+    with stage('metrics:inventory', rows=len(df_final)):
+        add_inventory_metrics(df_final)
+
+    # Sheet1 (利润)
+    cols_s1_final = cols_master_AM + ['SKU销量', 'P列_SKU总毛利', 'Q列_产品总利润', 'R列_产品总广告费', 'S列_最终净利润']
+    df_final_clean = df_final[cols_s1_final].copy()
+
+    cols_inv_final = cols_master_AM + ['火箭仓库存数量', '极风库存', '总库存', '库存货值', '滞销库存货值', '待补数量', 'SKU销量', '安全库存', '冗余标准']
+    df_sheet3 = df_final[cols_inv_final].copy()
+
+    # 重命名
+    rename_dict = {
+        'P列_SKU总毛利': 'SKU总毛利',
+        'Q列_产品总利润': '产品总利润',
+        'R列_产品总广告费': '产品总广告费',
+        'S列_最终净利润': '最终净利润'
+    }
+    df_final_clean.rename(columns=rename_dict, inplace=True)
+    df_sheet2.rename(columns=rename_dict, inplace=True)
+    return df_final_clean, df_sheet2, df_sheet3
+
+# ==========================================
+# 5. 筛选 (产品检索索引)
+# ==========================================
+
+# 检索字段: 产品编号 / SKU ID / 条码 / 登品店铺 (利润分析的主表列)
+SEARCH_FIELDS = (IDX_M_CODE, IDX_M_SKU, IDX_M_BAR, IDX_M_SHOP)
+QUERY_SEPARATOR = re.compile(r'[\s,，;；、]+')
+
+# 查询拆分为多个检索词 (逗号 / 空白 / 分号分隔)，与匹配键相同的规范化 (去 .0 / 引号，大写)
+def parse_query(text):
+    terms = [t for t in QUERY_SEPARATOR.split(str(text or '')) if t]
+    return list(dict.fromkeys(clean_for_match(pd.Series(terms, dtype=object)))) if terms else []
+
+# 前缀索引: 四个检索字段的规范化取值合并排序，每个检索词用两次二分查找得到匹配的行号区间
+# 行号为利润分析 (与库存分析一一对应) 的行位置；业务报表的行经产品编号映射到同一套产品编号
+class ProductIndex:
+    def __init__(self, df_final_clean, df_sheet2):
+        code_col = df_final_clean.columns[IDX_M_CODE]
+        product_keys = clean_for_match(df_final_clean[code_col])
+        self.product_of_row, self.products = pd.factorize(product_keys)
+        self.product_of_sheet2 = self.products.get_indexer(clean_for_match(df_sheet2[code_col]))
+        self.n_rows = len(df_final_clean)
+
+        keys, rows = [], []
+        positions = np.arange(self.n_rows)
+        for idx in SEARCH_FIELDS:
+            values = product_keys if idx == IDX_M_CODE else clean_for_match(df_final_clean.iloc[:, idx])
+            valid = (values.notna() & (values != '')).to_numpy()
+            keys.append(values.to_numpy(dtype=object)[valid])
+            rows.append(positions[valid])
+        keys, rows = np.concatenate(keys), np.concatenate(rows)
+        order = pd.Series(keys, dtype='str').argsort(kind='stable').to_numpy()  # Arrow 字符串排序 (码位顺序，与 searchsorted 一致)
+        self.keys, self.rows = keys[order], rows[order]
+
+    # 匹配任一检索词 (前缀) 的行号 (去重，升序)
+    def lookup(self, query):
+        hits = []
+        for term in parse_query(query):
+            lo = np.searchsorted(self.keys, term, side='left')
+            hi = np.searchsorted(self.keys, term + '\U0010ffff', side='left')
+            hits.append(self.rows[lo:hi])
+        return np.unique(np.concatenate(hits)) if hits else np.empty(0, dtype=np.int64)
+
+    # 匹配的产品编号 (规范化后的 _MATCH_CODE，可用于趋势分析等按产品编号的表)
+    def product_codes(self, query):
+        products = np.unique(self.product_of_row[self.lookup(query)])
+        return self.products[products[products >= 0]]
+
+    # (利润分析 / 库存分析行掩码, 业务报表行掩码)；空查询返回全部为 True
+    # 业务报表显示命中行所属的产品 (按 SKU / 条码 / 店铺检索时显示其产品)
+    def masks(self, query):
+        if not parse_query(query):
+            return np.ones(self.n_rows, dtype=bool), np.ones(len(self.product_of_sheet2), dtype=bool)
+        rows = self.lookup(query)
+        mask_sku = np.zeros(self.n_rows, dtype=bool)
+        mask_sku[rows] = True
+        hit = np.zeros(len(self.products) + 1, dtype=bool)  # 末位对应 -1 (编号为空)
+        hit[self.product_of_row[rows]] = True
+        hit[-1] = False
+        return mask_sku, hit[self.product_of_sheet2]
+
+# 利润筛选掩码
+def profit_mask(series, filter_profit):
+    if filter_profit == PROFIT_POS:
+        return (series > 0).to_numpy()
+    if filter_profit == PROFIT_NEG:
+        return (series < 0).to_numpy()
+    return np.ones(len(series), dtype=bool)
+
+# 筛选 + 插入序号 (输入为 compute_report 的结果，不会被修改)
+# filter_code 为检索词 (可多个，按前缀匹配产品编号 / SKU ID / 条码 / 店铺)；index 为同一结果预先建好的 ProductIndex
+# 利润分析与库存分析行一一对应，共用同一个掩码
+def filter_sheets(df_final_clean, df_sheet2, df_sheet3, filter_code='', filter_profit=PROFIT_ALL, index=None):
+    if parse_query(filter_code):
+        index = index if index is not None else ProductIndex(df_final_clean, df_sheet2)
+        mask_sku, mask_prod = index.masks(filter_code)
+    else:
+        mask_sku, mask_prod = np.ones(len(df_final_clean), dtype=bool), np.ones(len(df_sheet2), dtype=bool)
+    mask_sku = mask_sku & profit_mask(df_final_clean['最终净利润'], filter_profit)
+    mask_prod = mask_prod & profit_mask(df_sheet2['最终净利润'], filter_profit)
+
+    df_final_clean = df_final_clean[mask_sku].reset_index(drop=True)
+    df_sheet3 = df_sheet3[mask_sku].reset_index(drop=True)
+    df_sheet2 = df_sheet2[mask_prod].reset_index(drop=True)
+
+    # 插入序号
+    df_sheet2.insert(0, f"产品总数【{len(df_sheet2)}】", range(1, len(df_sheet2) + 1))
+    df_final_clean.insert(0, f"SKU总数【{len(df_final_clean)}】", range(1, len(df_final_clean) + 1))
+    df_sheet3.insert(0, f"SKU总数【{len(df_sheet3)}】", range(1, len(df_sheet3) + 1))
+    return df_final_clean, df_sheet2, df_sheet3
+
+# ==========================================
+# 6. 流水线入口
+# ==========================================
+
+# 完整报表流水线: 原始 DataFrame -> (利润分析, 业务报表, 库存分析)
+# sales / ads / inv / inv_j 可传单个 DataFrame 或 DataFrame 列表, inv / inv_j 可为空
+def build_report(master, sales, ads, inv=None, inv_j=None, filter_code='', filter_profit=PROFIT_ALL):
+    inv, inv_j = concat_frames(inv), concat_frames(inv_j)
+    return build_report_from_clean(
+        prepare_master(master),
+        clean_sales(concat_frames(sales)),
+        clean_ads(concat_frames(ads)),
+        clean_inv(inv) if inv is not None else None,
+        clean_inv_j(inv_j) if inv_j is not None else None,
+        filter_code, filter_profit,
+    )
+
+# 从已清洗数据开始的流水线 (供解析缓存使用)，df_calc 为 prepare_master 的结果
+def build_report_from_clean(df_calc, sales_clean, ads_clean, inv_clean=None, inv_j_clean=None, filter_code='', filter_profit=PROFIT_ALL):
+    sheets = compute_report(df_calc, sales_clean, ads_clean, inv_clean, inv_j_clean)
+    return filter_sheets(*sheets, filter_code=filter_code, filter_profit=filter_profit)
+
+# 计算引擎: pandas (参照实现) / duckdb (可选，pip install duckdb)
+BACKENDS = ('pandas', 'duckdb')
+
+# 当前环境可用的计算引擎
+def available_backends():
+    return [b for b in BACKENDS if b == 'pandas' or importlib.util.find_spec(b)]
+
+# 计算未筛选的三张报表 (耗时部分)，结果可缓存后多次调用 filter_sheets
+# backend 只影响 Step 5 (汇总 + 关联)，报表构造两者共用
+# 各清洗结果可为 DataFrame / 列表 / None，列表中可含 Parquet 路径 (load_inputs(parquet=True))：
+# duckdb 直接扫描文件，pandas 版读入后合并
+def compute_report(df_calc, sales_clean, ads_clean, inv_clean=None, inv_j_clean=None, backend='pandas'):
+    if backend not in available_backends():
+        raise ValueError(f"计算引擎不可用: {backend} (可用: {', '.join(available_backends())})")
+    with stage('merge_tables', rows=len(df_calc)):
+        if backend == 'duckdb':
+            from duckdb_engine import merge_tables_duckdb
+            df_final = merge_tables_duckdb(df_calc, sales_clean, ads_clean, inv_clean, inv_j_clean)
+        else:
+            df_final = merge_tables(
+                df_calc,
+                combine_clean(sales_clean, 'sales'),
+                combine_clean(ads_clean, 'ads'),
+                combine_clean(inv_clean, 'inv'),
+                combine_clean(inv_j_clean, 'inv_j'),
+            )
+    with stage('build_sheets', rows=len(df_final)):
+        return build_sheets(df_final, df_calc.columns[:MASTER_COLUMNS].tolist())
@@ -0,0 +1,137 @@
+import io
+import math
+import os
+import shutil
+import tempfile
+import zipfile
+
+import numpy as np
+import xlsxwriter
+
+from engine import IDX_M_CODE
+from instrument import stage
+
+# ==========================================
+# 报表导出: Excel (xlsxwriter constant_memory) / CSV / Parquet 压缩包
+# ==========================================
+
+SHEET_NAMES = ('利润分析', '业务报表', '库存分析')
+
+PCT_KEYWORDS = ['比', '率', '占比']
+INT_KEYWORDS = ['利润', '费用', '货值', '金额', '毛利', '销量', '库存', '数量', '标准', '待补', '序号', '广告费']
+BOLD_COLUMNS = ['自然销量占比', '总库存']
+GREY_BG = '#BFBFBF'
+
+# 斑马纹分组: 分组列内容变化时切换底色，返回每行是否为灰色
+def zebra_groups(series):
+    codes = series.astype(str).str.replace('.0', '', regex=False).str.replace('"', '', regex=False).str.strip().str.upper()
+    groups = (codes != codes.shift()).cumsum()
+    return (groups % 2 == 0).to_numpy()
+
+# 按列名决定单元格格式 (格式名) 与列宽
+def column_style(col, formats):
+    c_str = str(col)
+    is_bold_col = col in BOLD_COLUMNS
+    if any(x in c_str for x in PCT_KEYWORDS):
+        return 'pct_bold' if is_bold_col else 'pct', 12
+    if any(x in c_str for x in INT_KEYWORDS):
+        return 'int_bold' if is_bold_col else 'int', 15
+    return 'text', 12
+
+# 单个单元格写入 (按值类型选择写入方法，NaN 写空白)
+def _write_value(ws, row, col, value, fmt):
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        ws.write_blank(row, col, None, fmt)
+    elif isinstance(value, (int, float, np.integer, np.floating)) and not isinstance(value, bool):
+        if math.isinf(value):
+            ws.write_string(row, col, 'inf', fmt)
+        else:
+            ws.write_number(row, col, value, fmt)
+    else:
+        ws.write_string(row, col, str(value), fmt)
+
+# 写入一张工作表: 逐行写入 (constant_memory 要求按行顺序)，
+# 斑马纹直接写在单元格格式中 (每种列格式各有一个灰底版本)，不增加数据列，也不逐行 set_row
+def write_sheet(wb, formats, sheet_name, df_obj, group_col):
+    ws = wb.add_worksheet(sheet_name)
+    n_rows, n_cols = len(df_obj), len(df_obj.columns)
+    styles = [column_style(col, formats) for col in df_obj.columns]
+
+    for i, col in enumerate(df_obj.columns):
+        ws.set_column(i, i, styles[i][1])
+        ws.write(0, i, col, formats['header'])
+
+    columns = [df_obj.iloc[:, i].tolist() for i in range(n_cols)]
+    is_grey = zebra_groups(df_obj.iloc[:, group_col]).tolist()
+    row_formats = ([name for name, _ in styles], [f"{name}_grey" for name, _ in styles])
+    row_formats = tuple([formats[name] for name in names] for names in row_formats)
+    for r in range(n_rows):
+        cell_formats = row_formats[is_grey[r]]
+        for c in range(n_cols):
+            _write_value(ws, r + 1, c, columns[c][r], cell_formats[c])
+
+    if n_rows:
+        # 广告费占比预警 (条件格式优先于单元格底色)
+        for i, col in enumerate(df_obj.columns):
+            if col == '广告费占比':
+                ws.conditional_format(1, i, n_rows, i, {'type': 'cell', 'criteria': '>', 'value': 0.5, 'format': formats['red_alert']})
+
+# 单元格格式: 每种列格式另有一个斑马纹灰底版本 (名称加 _grey)
+def _add_formats(wb):
+    base = {'border': 1, 'align': 'center', 'valign': 'vcenter'}
+    cells = {
+        'text': base,
+        'int': {**base, 'num_format': '#,##0'},
+        'pct': {**base, 'num_format': '0.0%'},
+        'pct_bold': {**base, 'num_format': '0.0%', 'bold': True},
+        'int_bold': {**base, 'num_format': '#,##0', 'bold': True},
+    }
+    formats = {
+        'header': wb.add_format({'bold': True, 'bg_color': '#4472C4', 'font_color': 'white', 'border': 1, 'align': 'center', 'valign': 'vcenter'}),
+        'red_alert': wb.add_format({'num_format': '0.0%', 'bold': True, 'font_color': '#9C0006', 'bg_color': '#FFC7CE'}),
+    }
+    for name, props in cells.items():
+        formats[name] = wb.add_format(props)
+        formats[f"{name}_grey"] = wb.add_format({**props, 'bg_color': GREY_BG})
+    return formats
+
+def _write_workbook(path, df_final_clean, df_sheet2, df_sheet3):
+    with stage('export:xlsx', rows=len(df_final_clean) + len(df_sheet2) + len(df_sheet3)):
+        wb = xlsxwriter.Workbook(path, {'constant_memory': True})
+        formats = _add_formats(wb)
+        # 分组列: 业务报表按第 2 列 (序号之后)，其余两表沿用原有列位置
+        write_sheet(wb, formats, SHEET_NAMES[0], df_final_clean, IDX_M_CODE)
+        write_sheet(wb, formats, SHEET_NAMES[1], df_sheet2, IDX_M_CODE + 1)
+        write_sheet(wb, formats, SHEET_NAMES[2], df_sheet3, IDX_M_CODE)
+        wb.close()
+
+# 导出三张报表到 xlsx，output 可为文件路径或可写文件对象 (如 BytesIO)
+# 先写入临时文件 (constant_memory 模式行数据直接落盘)，再复制到 output
+def export_excel(df_final_clean, df_sheet2, df_sheet3, output):
+    if isinstance(output, (str, os.PathLike)):
+        _write_workbook(output, df_final_clean, df_sheet2, df_sheet3)
+        return output
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'report.xlsx')
+        _write_workbook(path, df_final_clean, df_sheet2, df_sheet3)
+        with open(path, 'rb') as f:
+            shutil.copyfileobj(f, output)
+    return output
+
+# 生成 Excel 字节串 (供下载按钮使用)
+def excel_bytes(df_final_clean, df_sheet2, df_sheet3):
+    return export_excel(df_final_clean, df_sheet2, df_sheet3, io.BytesIO()).getvalue()
+
+# 导出为 zip 压缩包 (每张报表一个文件)，fmt 为 'csv' (UTF-8 BOM，Excel 可直接打开) 或 'parquet'
+def export_bundle(df_final_clean, df_sheet2, df_sheet3, fmt='csv'):
+    buf = io.BytesIO()
+    with stage(f"export:{fmt}", rows=len(df_final_clean) + len(df_sheet2) + len(df_sheet3)):
+        with zipfile.ZipFile(buf, 'w', zipfile.ZIP_DEFLATED) as zf:
+            for name, df in zip(SHEET_NAMES, (df_final_clean, df_sheet2, df_sheet3)):
+                if fmt == 'parquet':
+                    part = io.BytesIO()
+                    df.to_parquet(part, index=False)
+                    zf.writestr(f"{name}.parquet", part.getvalue())
+                else:
+                    zf.writestr(f"{name}.csv", df.to_csv(index=False).encode('utf-8-sig'))
+    return buf.getvalue()
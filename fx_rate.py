@@ -0,0 +1,116 @@
+import collections
+import datetime
+import json
+import os
+import threading
+import uuid
+
+import requests
+
+# ==========================================
+# 汇率 (KRW -> CNY): 后台线程获取，不阻塞页面
+# 最近一次成功获取的汇率与时间保存在本地，冷启动 / 离线时直接使用；从未获取成功才使用默认值
+# 数据源可替换 (任意无参函数，返回汇率或抛出异常)，测试 / 内网部署可用 StaticSource
+# ==========================================
+
+DEFAULT_RATE = 0.0048
+API_URL = "https://api.exchangerate-api.com/v4/latest/KRW"
+REFRESH_SECONDS = 3600
+
+DEFAULT_RATE_PATH = os.environ.get('COUPANG_FX_PATH', os.path.join(os.path.expanduser('~'), '.local', 'share', 'coupang_report', 'fx_rate.json'))
+
+# 汇率状态: live (有效期内) / stored (本地保存的旧值，正在后台更新) / default (从未获取成功)
+STATUS_LIVE, STATUS_STORED, STATUS_DEFAULT = 'live', 'stored', 'default'
+RateInfo = collections.namedtuple('RateInfo', ['rate', 'fetched_at', 'status'])
+
+# 默认数据源: 免费公开 API (Base: KRW)
+def fetch_exchangerate_api(timeout=3):
+    response = requests.get(API_URL, timeout=timeout)
+    response.raise_for_status()
+    rate = response.json()['rates'].get('CNY')
+    if not rate:
+        raise ValueError("API 返回中没有 CNY 汇率")
+    return float(rate)
+
+# 固定汇率数据源 (测试 / 离线部署)
+class StaticSource:
+    def __init__(self, rate):
+        self.rate = float(rate)
+
+    def __call__(self):
+        return self.rate
+
+# 环境变量 COUPANG_FX_RATE 设置时使用固定汇率，否则使用在线 API
+def source_from_env():
+    rate = os.environ.get('COUPANG_FX_RATE')
+    return StaticSource(rate) if rate else fetch_exchangerate_api
+
+class RateProvider:
+    def __init__(self, source=fetch_exchangerate_api, path=DEFAULT_RATE_PATH, max_age=REFRESH_SECONDS):
+        self.source = source
+        self.path = path
+        self.max_age = max_age
+        self.last_error = None
+        self._lock = threading.Lock()
+        self._thread = None
+        self._rate, self._fetched_at = self._load()
+
+    # 读取本地保存的汇率，不存在或损坏返回 (None, None)
+    def _load(self):
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                data = json.load(f)
+            return float(data['rate']), datetime.datetime.fromisoformat(data['fetched_at'])
+        except (OSError, ValueError, KeyError, TypeError):
+            return None, None
+
+    # 原子写入 (先写临时文件再替换)，写入失败不影响使用
+    def _save(self, rate, fetched_at):
+        tmp = f"{self.path}.{uuid.uuid4().hex}.tmp"
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump({'rate': rate, 'fetched_at': fetched_at.isoformat(timespec='seconds')}, f)
+            os.replace(tmp, self.path)
+        except OSError:
+            if os.path.exists(tmp): os.remove(tmp)
+
+    def _is_fresh(self):
+        if self._fetched_at is None:
+            return False
+        return (datetime.datetime.now() - self._fetched_at).total_seconds() < self.max_age
+
+    # 获取一次 (在后台线程中执行)
+    def _fetch(self):
+        try:
+            rate = float(self.source())
+            if not rate > 0:
+                raise ValueError(f"无效汇率: {rate}")
+        except Exception as e:
+            with self._lock:
+                self.last_error = e
+            return
+        fetched_at = datetime.datetime.now()
+        with self._lock:
+            self._rate, self._fetched_at, self.last_error = rate, fetched_at, None
+        self._save(rate, fetched_at)
+
+    # 启动后台更新 (已有更新在进行时不重复启动)；wait=True 时等待完成 (命令行 / 测试)
+    def refresh(self, wait=False, timeout=None):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._fetch, name='fx-rate-refresh', daemon=True)
+                self._thread.start()
+            thread = self._thread
+        if wait:
+            thread.join(timeout)
+
+    # 立即返回当前汇率 (不等待网络)，过期时顺带触发后台更新
+    def get(self):
+        with self._lock:
+            rate, fetched_at, fresh = self._rate, self._fetched_at, self._is_fresh()
+        if not fresh:
+            self.refresh()
+        if rate is None:
+            return RateInfo(DEFAULT_RATE, None, STATUS_DEFAULT)
+        return RateInfo(rate, fetched_at, STATUS_LIVE if fresh else STATUS_STORED)
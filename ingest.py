@@ -0,0 +1,142 @@
+import io
+import multiprocessing
+import os
+from concurrent.futures import FIRST_EXCEPTION, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+import pyarrow.parquet as pq
+
+from engine import load_clean, read_bytes, resolve_columns
+from instrument import stage
+from parse_cache import cache_key
+from streaming import stream_aggregate
+
+# ==========================================
+# 并行读取: 多个上传文件同时解析 + 清洗
+# xlsx (openpyxl 解析为 CPU 密集) 用进程池，csv 用线程池
+# 结果按上传顺序返回，保证合并顺序与串行读取一致
+# ==========================================
+
+DEFAULT_WORKERS = int(os.environ.get('COUPANG_WORKERS', '0')) or (os.cpu_count() or 1)
+
+# 进程池在首次使用时创建并复用 (spawn: 避免在 Streamlit 多线程进程中 fork)
+_process_pool = None
+_process_pool_size = 0
+
+def _get_process_pool(workers):
+    global _process_pool, _process_pool_size
+    if _process_pool is None or _process_pool_size != workers:
+        if _process_pool is not None:
+            _process_pool.shutdown(wait=False)
+        _process_pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+        _process_pool_size = workers
+    return _process_pool
+
+def _named_buffer(name, data):
+    buf = io.BytesIO(data)
+    buf.name = name
+    return buf
+
+# 单个文件的解析 + 清洗 (在工作进程 / 线程中执行，参数需可 pickle)；cmap 为 None 时先在工作进程中解析列映射
+def read_and_clean(name, data, kind, cmap=None):
+    return load_clean(_named_buffer(name, data), kind, cmap)
+
+def _file_name(file):
+    return str(getattr(file, 'name', file))
+
+# 清洗结果的行数 (DataFrame 或 Parquet 路径)
+def _rows(part):
+    return pq.read_metadata(part).num_rows if isinstance(part, str) else len(part)
+
+# 读取并清洗多组文件
+# groups: {kind: [file, ...]}，kind 为 engine.CLEANERS 中的类型；cache 为 ParseCache 或 None
+# parquet: 这些类型命中缓存时返回 Parquet 文件路径而不读入内存 (供 DuckDB 直接扫描)
+# 返回 {kind: [DataFrame 或 Parquet 路径, ...] 或 None (该组无文件)}
+def load_groups(groups, cache=None, workers=DEFAULT_WORKERS, parquet=()):
+    jobs = []     # (kind, 序号, 文件名, 字节, 缓存键)
+    hits = []     # 以路径返回的缓存命中，同上
+    results = {kind: [None] * len(files or []) for kind, files in groups.items()}
+    for kind, files in groups.items():
+        for i, file in enumerate(files or []):
+            data = read_bytes(file)
+            key = cache_key(data, kind)
+            if kind in parquet and cache is not None:
+                path = cache.path(key)
+                if path is not None:
+                    results[kind][i] = path
+                    hits.append((kind, i, _file_name(file), data, key))
+                    continue
+            df = cache.get(key) if cache is not None else None
+            if df is None:
+                jobs.append((kind, i, _file_name(file), data, key))
+            else:
+                results[kind][i] = df
+
+    is_xlsx = [not name.lower().endswith('.csv') for _, _, name, _, _ in jobs]
+    if workers <= 1 or len(jobs) <= 1:
+        # 串行: 先逐个只读表头校验列映射，任一文件不合格时在完整解析之前报错
+        cmaps = [resolve_columns(_named_buffer(name, data), kind) for kind, _, name, data, _ in jobs]
+        for (kind, i, name, data, _), cmap in zip(jobs, cmaps):
+            results[kind][i] = read_and_clean(name, data, kind, cmap)
+    else:
+        # 并行: 列映射在各自的工作进程 / 线程中解析 (表头校验也并行)，任一文件出错即取消尚未开始的任务
+        # 只有一个 xlsx 时没必要启动进程池
+        n_xlsx = sum(is_xlsx)
+        process_pool = _get_process_pool(workers) if n_xlsx > 1 else None
+        with ThreadPoolExecutor(max_workers=workers) as thread_pool:
+            futures = []
+            for (kind, i, name, data, _), xlsx in zip(jobs, is_xlsx):
+                pool = process_pool if xlsx and process_pool is not None else thread_pool
+                futures.append((kind, i, pool.submit(read_and_clean, name, data, kind)))
+            done, pending = wait([future for _, _, future in futures], return_when=FIRST_EXCEPTION)
+            failed = [future for _, _, future in futures if future in done and future.exception() is not None]
+            if failed:
+                for future in pending:
+                    future.cancel()
+                raise failed[0].exception()
+            for kind, i, future in futures:
+                results[kind][i] = future.result()
+
+    if cache is not None:
+        for kind, i, _, _, key in jobs:
+            cache.put(key, results[kind][i])
+    # 写入新缓存时被容量淘汰的命中文件 (缓存上限小于本次所需) 重新解析
+    for kind, i, name, data, _ in hits:
+        if not os.path.exists(results[kind][i]):
+            results[kind][i] = read_and_clean(name, data, kind)
+    return {kind: (frames or None) for kind, frames in results.items()}
+
+# 读取报表所需的全部文件，返回可直接传给 engine.compute_report 的参数
+# stream=True 时销售表 / 广告表改为流式汇总 (不经过解析缓存，内存只与匹配键数量相关)
+# store 为 AggregateStore 时销售表 / 广告表走增量汇总库: 只解析库中没有的文件，
+# 再与 stored ({kind: [哈希, ...]}，未随本次上传的历史文件) 一起合并部分和
+# parquet=True 时 (DuckDB 引擎) 销售 / 广告 / 库存表命中解析缓存的文件以 Parquet 路径返回，由查询直接扫描
+def load_inputs(master, sales, ads, inv=None, inv_j=None, cache=None, workers=DEFAULT_WORKERS, stream=False, store=None, stored=None, parquet=False):
+    groups = {'master': [master], 'inv': inv, 'inv_j': inv_j}
+    pending = {}
+    if store is not None:
+        for kind, files in (('sales', sales), ('ads', ads)):
+            pending[kind] = store.split(files, kind)
+            if not stream:
+                groups[kind] = [f for _, f in pending[kind][1]]
+    elif not stream:
+        groups.update(sales=sales, ads=ads)
+    # 汇总库需要新文件的清洗结果入库，销售 / 广告表此时不以路径返回
+    parquet_kinds = (('inv', 'inv_j') + (('sales', 'ads') if store is None else ())) if parquet else ()
+    with stage('read+clean') as s:
+        loaded = load_groups(groups, cache, workers, parquet_kinds)
+        s['rows'] = sum(_rows(part) for frames in loaded.values() for part in frames or [])
+
+    if store is not None:
+        for kind, (hashes, new) in pending.items():
+            with stage(f"store:{kind}") as s:
+                cleaned = [stream_aggregate([f], kind) for _, f in new] if stream else (loaded.get(kind) or [])
+                for (h, f), clean in zip(new, cleaned):
+                    store.add(h, kind, _file_name(f), clean)
+                loaded[kind] = store.load([*hashes, *(stored or {}).get(kind, [])], kind)
+                s['rows'] = len(loaded[kind])
+    elif stream:
+        for kind, files in (('sales', sales), ('ads', ads)):
+            with stage(f"stream:{kind}") as s:
+                loaded[kind] = stream_aggregate(files, kind)
+                s['rows'] = 0 if loaded[kind] is None else len(loaded[kind])
+    return loaded['master'][0], loaded['sales'], loaded['ads'], loaded['inv'], loaded['inv_j']
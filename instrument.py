@@ -0,0 +1,108 @@
+import contextvars
+import datetime
+import json
+import sys
+import time
+from contextlib import contextmanager
+
+# ==========================================
+# 阶段计时: 记录每个流水线阶段的耗时、行数、内存 (当前 RSS / 阶段内峰值 RSS)
+# 未激活 StageRecorder 时 stage() 不做任何事，引擎代码可直接埋点
+# 注: 只统计当前进程 (进程池中的解析不计入内存)；工作线程中的阶段不记录
+# ==========================================
+
+_recorder = contextvars.ContextVar('stage_recorder', default=None)
+_depth = contextvars.ContextVar('stage_depth', default=0)
+
+# /proc/self/status 中的内存字段 (MB)，非 Linux 返回 None
+def _proc_status_mb(field):
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith(field + ':'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+def current_rss_mb():
+    return _proc_status_mb('VmRSS')
+
+# 峰值 RSS: Linux 读 VmHWM (可重置)，其他系统退回 getrusage (进程启动以来的峰值)
+def peak_rss_mb():
+    peak = _proc_status_mb('VmHWM')
+    if peak is not None:
+        return peak
+    try:
+        import resource
+    except ImportError:
+        return None
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss / (1024 * 1024) if sys.platform == 'darwin' else maxrss / 1024
+
+# 重置峰值 RSS (Linux: 写 /proc/self/clear_refs)，使峰值只反映本阶段
+def _reset_peak():
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+
+class StageRecorder:
+    def __init__(self):
+        self.records = []
+
+    # 在 with 块内激活 (同一线程 / 上下文中的 stage() 写入本记录器)
+    @contextmanager
+    def activate(self):
+        token = _recorder.set(self)
+        try:
+            yield self
+        finally:
+            _recorder.reset(token)
+
+    def total_seconds(self):
+        return sum(r['seconds'] for r in self.records if r['depth'] == 0)
+
+    # 以 JSON lines 追加写入 (target 为路径或文件对象，'-' 为标准输出)，extra 为每行附加字段
+    def write_jsonl(self, target, **extra):
+        run = datetime.datetime.now().isoformat(timespec='seconds')
+        lines = [json.dumps({'run': run, **extra, **r}, ensure_ascii=False) for r in self.records]
+        if target == '-':
+            target = sys.stdout
+        if hasattr(target, 'write'):
+            target.write('\n'.join(lines) + '\n')
+            return
+        with open(target, 'a', encoding='utf-8') as f:
+            f.write('\n'.join(lines) + '\n')
+
+# 记录一个阶段；可在块内设置 info['rows'] 补充行数
+# 嵌套阶段的峰值取自身与子阶段的最大值 (子阶段会重置峰值计数)
+@contextmanager
+def stage(name, rows=None):
+    recorder = _recorder.get()
+    info = {'rows': rows}
+    if recorder is None:
+        yield info
+        return
+    depth = _depth.get()
+    record = {'stage': name, 'depth': depth}
+    recorder.records.append(record)
+    first_child = len(recorder.records)
+    token = _depth.set(depth + 1)
+    _reset_peak()
+    t0 = time.perf_counter()
+    try:
+        yield info
+    finally:
+        seconds = time.perf_counter() - t0
+        _depth.reset(token)
+        peaks = [peak_rss_mb()] + [r.get('peak_rss_mb') for r in recorder.records[first_child:]]
+        peaks = [p for p in peaks if p is not None]
+        rss = current_rss_mb()
+        record.update(
+            seconds=round(seconds, 4),
+            rows=info['rows'],
+            rss_mb=None if rss is None else round(rss, 1),
+            peak_rss_mb=round(max(peaks), 1) if peaks else None,
+        )
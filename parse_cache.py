@@ -0,0 +1,93 @@
+import hashlib
+import os
+import uuid
+
+import pandas as pd
+
+from engine import CLEANERS, SCHEMAS
+
+# ==========================================
+# 解析缓存: 按「文件内容哈希 + 列号配置」缓存清洗后的 DataFrame (Parquet)
+# 同一文件重复上传 / 切换筛选条件时无需再次解析 Excel
+# ==========================================
+
+# 清洗逻辑变化时递增，使旧缓存全部失效
+CACHE_VERSION = 3
+
+DEFAULT_CACHE_DIR = os.environ.get('COUPANG_CACHE_DIR', os.path.join(os.path.expanduser('~'), '.cache', 'coupang_report'))
+DEFAULT_MAX_MB = int(os.environ.get('COUPANG_CACHE_MAX_MB', '512'))
+
+# 缓存键: 内容哈希 + 文件类型 + 该类型依赖的列号 + 列映射声明 (修改别名 / 默认列号后旧缓存与汇总库哈希自动失效)
+def cache_key(data, kind):
+    _, columns = CLEANERS[kind]
+    h = hashlib.sha256(data)
+    h.update(f"|{kind}|{columns}|{SCHEMAS[kind]}|v{CACHE_VERSION}".encode())
+    return h.hexdigest()
+
+class ParseCache:
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_mb=DEFAULT_MAX_MB):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_mb * 1024 * 1024
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.parquet")
+
+    # 读取缓存，未命中返回 None
+    def get(self, key):
+        path = self._path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            df = pd.read_parquet(path)
+            os.utime(path)  # 刷新访问时间 (LRU)
+            return df
+        except Exception:
+            os.remove(path)
+            return None
+
+    # 缓存文件路径 (命中时刷新访问时间)，未命中返回 None；供 DuckDB 直接扫描，不读入内存
+    def path(self, key):
+        path = self._path(key)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    # 写入缓存 (先写临时文件再原子替换)，列名不支持 Parquet 等情况下直接跳过缓存
+    def put(self, key, df):
+        path = self._path(key)
+        tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+        try:
+            df.to_parquet(tmp, index=False)
+            os.replace(tmp, path)
+        except Exception:
+            if os.path.exists(tmp): os.remove(tmp)
+            return
+        self.evict()
+
+    # 超出容量上限时按最近访问时间淘汰 (LRU)
+    def evict(self):
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith('.parquet'): continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes: break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def clear(self):
+        for name in os.listdir(self.cache_dir):
+            if name.endswith('.parquet'):
+                os.remove(os.path.join(self.cache_dir, name))
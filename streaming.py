@@ -0,0 +1,110 @@
+import codecs
+from contextlib import contextmanager
+
+import numpy as np
+import openpyxl
+import pandas as pd
+
+from engine import CLEANERS, MATCH_KEYS, cell_str, partial_sums, read_columns, resolve_columns
+
+# ==========================================
+# 流式汇总: 超大销售 / 广告表逐块读取并累加到「每个匹配键一行」的部分和
+# 内存占用取决于不同 SKU / 编号的数量，而不是原始行数
+# CSV 用 read_csv(chunksize)，xlsx 用 openpyxl 只读模式逐行迭代
+# ==========================================
+
+CHUNK_ROWS = 100_000
+
+# 打开文件 (本地路径直接从磁盘读取，上传对象回到开头)
+@contextmanager
+def open_source(file):
+    if hasattr(file, 'read'):
+        file.seek(0)
+        yield file
+        file.seek(0)
+    else:
+        with open(file, 'rb') as fh:
+            yield fh
+
+# 逐块判断 CSV 编码 (不把整个文件读入内存)
+def sniff_encoding_stream(fh, block_size=1 << 20):
+    fh.seek(0)
+    try:
+        head = fh.read(3)
+        if head == codecs.BOM_UTF8:
+            return 'utf-8-sig'
+        decoder = codecs.getincrementaldecoder('utf-8')()
+        decoder.decode(head)
+        while True:
+            block = fh.read(block_size)
+            if not block: break
+            decoder.decode(block)
+        decoder.decode(b'', final=True)
+        return 'utf-8'
+    except UnicodeDecodeError:
+        return 'gbk'
+    finally:
+        fh.seek(0)
+
+# xlsx 逐行读取 (只读模式)，每 chunk_rows 行产出一个投影后的 DataFrame
+def _iter_xlsx_chunks(fh, usecols, chunk_rows):
+    wb = openpyxl.load_workbook(fh, read_only=True, data_only=True)
+    try:
+        rows = wb.worksheets[0].iter_rows(values_only=True)
+        next(rows, None)  # 表头
+        buf = []
+        for row in rows:
+            buf.append([cell_str(row[i]) if i < len(row) else np.nan for i in usecols])
+            if len(buf) >= chunk_rows:
+                yield _projected_frame(buf, usecols)
+                buf = []
+        if buf:
+            yield _projected_frame(buf, usecols)
+    finally:
+        wb.close()
+
+def _projected_frame(rows, usecols):
+    df = pd.DataFrame(rows, columns=usecols, dtype=object)
+    df.attrs['projected'] = True
+    return df
+
+# 分块读取单个文件 (只读 usecols 列)，结果以原始列号为列名；labels 为 {实际列号: 列名} 时改用该列名
+def iter_chunks(file, usecols, chunk_rows=CHUNK_ROWS, labels=None):
+    usecols = sorted(usecols)
+    for chunk in _iter_raw_chunks(file, usecols, chunk_rows):
+        if labels is not None:
+            chunk.columns = [labels[i] for i in usecols]
+        yield chunk
+
+def _iter_raw_chunks(file, usecols, chunk_rows):
+    with open_source(file) as fh:
+        is_xlsx = fh.read(4) == b'PK\x03\x04'
+        fh.seek(0)
+        if is_xlsx:
+            yield from _iter_xlsx_chunks(fh, usecols, chunk_rows)
+        else:
+            reader = pd.read_csv(fh, dtype=str, usecols=usecols, chunksize=chunk_rows, encoding=sniff_encoding_stream(fh))
+            with reader:
+                for chunk in reader:
+                    chunk.columns = usecols
+                    chunk.attrs['projected'] = True
+                    yield chunk
+
+# 流式汇总一组文件: 逐块清洗并累加到每个匹配键的部分和
+# 注: 浮点累加顺序与一次性 groupby 不同，含税广告费取整时 .5 附近可能相差 1
+# 返回与清洗结果同列的 DataFrame (每个键一行)，可直接传给 engine.compute_report；无文件返回 None
+def stream_aggregate(files, kind, chunk_rows=CHUNK_ROWS):
+    if not files:
+        return None
+    cleaner, _ = CLEANERS[kind]
+    key = MATCH_KEYS[kind]
+    cmaps = [resolve_columns(file, kind) for file in files]  # 先校验全部文件的列映射
+    acc = None
+    for file, cmap in zip(files, cmaps):
+        labels = {actual: canonical for canonical, actual in cmap.positions.items()}
+        for chunk in iter_chunks(file, sorted(labels), chunk_rows, labels):
+            part = partial_sums(cleaner(chunk), kind).set_index(key)
+            acc = part if acc is None else acc.add(part, fill_value=0)
+    if acc is None:
+        return cleaner(_projected_frame([], read_columns(kind)))
+    return acc.reset_index()
@@ -0,0 +1,200 @@
+import os
+import re
+import uuid
+
+import numpy as np
+import pandas as pd
+
+from engine import CLEAN_COLUMNS, MATCH_KEYS, encode_keys, partial_sums, read_bytes, safe_ratio
+from ingest import DEFAULT_WORKERS, _file_name, load_groups
+from parse_cache import cache_key
+
+# ==========================================
+# 趋势分析: 销售 / 广告文件按日期入库 (每个文件一个 Parquet，每天每个键一行)，
+# 按 _MATCH_CODE 计算本期 / 上期 (滚动窗口) 的利润、广告费占比、售罄率
+# 窗口汇总基于「产品编号 + 日期」排序后的前缀和，一次向量化完成全部产品与全部日期
+# ==========================================
+
+FACT_KINDS = ('sales', 'ads')
+DATE_COL = '日期'
+
+DEFAULT_FACTS_DIR = os.environ.get('COUPANG_FACTS_DIR', os.path.join(os.path.expanduser('~'), '.local', 'share', 'coupang_report', 'facts'))
+
+# 文件名中的日期 (如 sales_2024-05-01.xlsx / ads20240501.csv)
+DATE_PATTERN = re.compile(r'(20\d{2})[-_.]?(0[1-9]|1[0-2])[-_.]?(0[1-9]|[12]\d|3[01])')
+
+# 每日指标: 毛利 = 销量 × 单件利润 (与利润分析一致)，净利润 = 毛利 - 含税广告费
+DAILY_METRICS = ['销量', '毛利', '广告费', '广告销量']
+
+PERIOD_OPTIONS = (7, 14, 30)
+
+# 来源名: 文件名去掉扩展名与重复下载后缀 (如 " (1)")，只保留字母数字 / 中文 / . -
+# 同一日期 + 同一来源视为同一份数据 (重新导出的更正文件替换旧文件，不重复计入)
+_COPY_SUFFIX = re.compile(r'\s*\(\d+\)$')
+_UNSAFE_SOURCE = re.compile(r'[^\w.-]+|_{2,}')
+
+def source_name(file):
+    stem = os.path.splitext(os.path.basename(_file_name(file)))[0]
+    return _UNSAFE_SOURCE.sub('_', _COPY_SUFFIX.sub('', stem).strip().lower()).strip('_') or 'file'
+
+# 从文件名解析日期，无法识别返回 None
+def file_date(file):
+    match = DATE_PATTERN.search(os.path.basename(_file_name(file)))
+    if match is None:
+        return None
+    return pd.Timestamp(f"{match.group(1)}-{match.group(2)}-{match.group(3)}")
+
+class FactStore:
+    def __init__(self, facts_dir=DEFAULT_FACTS_DIR):
+        self.facts_dir = facts_dir
+        for kind in FACT_KINDS:
+            os.makedirs(os.path.join(facts_dir, kind), exist_ok=True)
+
+    # 文件名: {日期}__{来源}__{内容哈希}.parquet
+    def _prefix(self, date, source):
+        return f"{pd.Timestamp(date):%Y-%m-%d}__{source}__"
+
+    def _names(self, kind):
+        return [name for name in os.listdir(os.path.join(self.facts_dir, kind)) if name.endswith('.parquet')]
+
+    # 同样内容的文件是否已入库
+    def has(self, kind, key):
+        return any(name.endswith(f"__{key}.parquet") for name in self._names(kind))
+
+    # 写入一个文件的日汇总 (先写临时文件再原子替换)，并删除同一日期 + 来源的旧版本
+    def put(self, kind, date, source, key, df):
+        prefix = self._prefix(date, source)
+        path = os.path.join(self.facts_dir, kind, f"{prefix}{key}.parquet")
+        tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+        df.to_parquet(tmp, index=False)
+        os.replace(tmp, path)
+        for name in self._names(kind):
+            if name.startswith(prefix) and name != os.path.basename(path):
+                os.remove(os.path.join(self.facts_dir, kind, name))
+
+    # 读取某类全部日汇总 (可按日期范围过滤)，同一天多个文件合并为每天每个键一行
+    def load(self, kind, start=None, end=None):
+        frames = [pd.read_parquet(os.path.join(self.facts_dir, kind, name)) for name in sorted(self._names(kind))]
+        if not frames:
+            return pd.DataFrame({DATE_COL: pd.Series(dtype='datetime64[ns]'), **{c: pd.Series(dtype=object if c.startswith('_') else float) for c in CLEAN_COLUMNS[kind]}})
+        df = pd.concat(frames, ignore_index=True)
+        if start is not None: df = df[df[DATE_COL] >= pd.Timestamp(start)]
+        if end is not None: df = df[df[DATE_COL] <= pd.Timestamp(end)]
+        df[MATCH_KEYS[kind]] = df[MATCH_KEYS[kind]].astype(object)
+        return df.groupby([DATE_COL, MATCH_KEYS[kind]], sort=False, observed=True).sum().reset_index()
+
+    def clear(self):
+        for kind in FACT_KINDS:
+            for name in self._names(kind):
+                os.remove(os.path.join(self.facts_dir, kind, name))
+
+# 按日期入库一组文件 (内容相同的跳过，同一日期 + 来源的新文件替换旧文件)，返回无法识别日期的文件名
+def ingest_facts(store, files, kind, cache=None, workers=DEFAULT_WORKERS):
+    undated, new = [], []
+    for file in files or []:
+        date = file_date(file)
+        if date is None:
+            undated.append(_file_name(file))
+            continue
+        key = cache_key(read_bytes(file), kind)
+        if not store.has(kind, key):
+            new.append((key, date, source_name(file), file))
+    cleaned = load_groups({kind: [f for *_, f in new]}, cache, workers)[kind] or []
+    for (key, date, source, _), clean in zip(new, cleaned):
+        part = partial_sums(clean, kind)
+        part[MATCH_KEYS[kind]] = part[MATCH_KEYS[kind]].astype('category')  # 字典编码，Parquet 更紧凑
+        part.insert(0, DATE_COL, date)
+        store.put(kind, date, source, key, part)
+    return undated
+
+# 每日事实表: 每个 (产品编号, 日期) 一行，列为 DAILY_METRICS
+# 销量经 SKU 关联到主表行 (主表重复 SKU 与利润分析一样各自计入)，广告按产品编号直接关联
+def daily_facts(df_calc, sales_facts, ads_facts):
+    master = df_calc.reset_index(drop=True)
+    _, sku_codes, (sales_codes,) = encode_keys(master['_MATCH_SKU'], sales_facts['_MATCH_SKU'])
+    rows = pd.DataFrame({'_sku': sku_codes, '_MATCH_CODE': master['_MATCH_CODE'].to_numpy(), '_profit': master['_VAL_PROFIT'].to_numpy(dtype=float)})
+    sales = pd.DataFrame({'_sku': sales_codes, DATE_COL: sales_facts[DATE_COL].to_numpy(), '销量': sales_facts['销量'].to_numpy(dtype=float)})
+    sales = sales.merge(rows, on='_sku')
+    sales['毛利'] = sales['销量'] * sales['_profit']
+
+    known_codes = master['_MATCH_CODE'].dropna().unique()
+    ads = ads_facts[ads_facts['_MATCH_CODE'].isin(known_codes)]
+    ads = pd.DataFrame({'_MATCH_CODE': ads['_MATCH_CODE'].to_numpy(), DATE_COL: ads[DATE_COL].to_numpy(), '广告费': ads['含税广告费'].to_numpy(dtype=float), '广告销量': ads['广告销量'].to_numpy(dtype=float)})
+
+    daily = pd.concat([sales[['_MATCH_CODE', DATE_COL, '销量', '毛利']], ads], ignore_index=True)
+    daily = daily.dropna(subset=['_MATCH_CODE'])
+    return daily.groupby(['_MATCH_CODE', DATE_COL], sort=True).sum()[DAILY_METRICS].reset_index()
+
+# 产品级当前总库存 (用于售罄率)，total_inventory 与 df_calc 行一一对应 (如库存分析的「总库存」)
+def inventory_by_code(df_calc, total_inventory):
+    return pd.Series(np.asarray(total_inventory, dtype=float)).groupby(df_calc['_MATCH_CODE'].to_numpy()).sum()
+
+# 前缀和索引: 按 (产品编号, 天) 排序的组合键 + 各指标累计和
+# 任意 (产品, 截止日) 的累计值 = 前缀和[searchsorted(组合键)] - 该产品起点的前缀和
+class _Prefix:
+    def __init__(self, daily, pad):
+        self.codes, self.uniques = pd.factorize(daily['_MATCH_CODE'], sort=True)
+        self.day0 = daily[DATE_COL].min() if len(daily) else pd.Timestamp(0)
+        days = self._day(daily[DATE_COL]) + pad
+        self.pad = pad
+        self.span = (int(days.max()) + 1) if len(days) else pad + 1
+        self.keys = self.codes.astype(np.int64) * self.span + days
+        order = np.argsort(self.keys, kind='stable')
+        self.keys = self.keys[order]
+        values = daily[DAILY_METRICS].to_numpy(dtype=float)[order]
+        self.cum = np.vstack([np.zeros((1, len(DAILY_METRICS))), np.cumsum(values, axis=0)])
+
+    def _day(self, dates):
+        return ((pd.to_datetime(dates) - self.day0) // pd.Timedelta(days=1)).to_numpy(dtype=np.int64)
+
+    # 产品 codes 截至 days (含当天) 的累计值，返回 (len, 指标数)
+    def at(self, codes, days):
+        codes = np.asarray(codes, dtype=np.int64)
+        days = np.clip(np.asarray(days, dtype=np.int64) + self.pad, 0, self.span - 1)
+        start = np.searchsorted(self.keys, codes * self.span, side='left')
+        end = np.searchsorted(self.keys, codes * self.span + days, side='right')
+        return self.cum[end] - self.cum[start]
+
+# 本期 (end 前 window 天，含 end) 与上期 (再往前 window 天) 对比，每个产品一行
+def period_compare(daily, end, window, inventory=None):
+    prefix = _Prefix(daily, 2 * window)
+    codes = np.arange(len(prefix.uniques))
+    end_day = np.full(len(codes), prefix._day(pd.Series([pd.Timestamp(end)]))[0])
+    s_end, s_mid, s_start = prefix.at(codes, end_day), prefix.at(codes, end_day - window), prefix.at(codes, end_day - 2 * window)
+    cur = pd.DataFrame(s_end - s_mid, columns=DAILY_METRICS)
+    prev = pd.DataFrame(s_mid - s_start, columns=DAILY_METRICS)
+
+    cur_profit = cur['毛利'] - cur['广告费']
+    prev_profit = prev['毛利'] - prev['广告费']
+    cur_ratio = safe_ratio(cur['广告费'], cur['毛利'])
+    prev_ratio = safe_ratio(prev['广告费'], prev['毛利'])
+    stock = np.zeros(len(codes)) if inventory is None else inventory.reindex(prefix.uniques).fillna(0).to_numpy(dtype=float)
+
+    df = pd.DataFrame({
+        '产品编号': np.asarray(prefix.uniques, dtype=object),
+        '本期销量': cur['销量'],
+        '上期销量': prev['销量'],
+        '销量环比': safe_ratio(cur['销量'] - prev['销量'], prev['销量'].abs()),
+        '本期毛利': cur['毛利'],
+        '本期广告费': cur['广告费'],
+        '本期净利润': cur_profit,
+        '上期净利润': prev_profit,
+        '净利润环比': safe_ratio(cur_profit - prev_profit, prev_profit.abs()),
+        '本期广告费占比': cur_ratio,
+        '上期广告费占比': prev_ratio,
+        '广告费占比变化': cur_ratio - prev_ratio,
+        '售罄率': safe_ratio(cur['销量'], cur['销量'] + stock),
+    })
+    active = (cur.abs().sum(axis=1) + prev.abs().sum(axis=1)) > 0
+    return df[active.to_numpy()].reset_index(drop=True)
+
+# 每日滚动窗口汇总 (codes 为 None 时汇总全部产品)，索引为日期，列为 DAILY_METRICS + 净利润
+def rolling_trend(daily, window, codes=None):
+    if codes is not None:
+        daily = daily[daily['_MATCH_CODE'].isin(codes)]
+    if daily.empty:
+        return pd.DataFrame(columns=DAILY_METRICS + ['净利润'])
+    dates = pd.date_range(daily[DATE_COL].min(), daily[DATE_COL].max(), freq='D', name=DATE_COL)
+    df = daily.groupby(DATE_COL)[DAILY_METRICS].sum().reindex(dates, fill_value=0).rolling(window, min_periods=1).sum()
+    df['净利润'] = df['毛利'] - df['广告费']
+    return df
@@ -0,0 +1,136 @@
+import math
+
+import numpy as np
+import pandas as pd
+
+from export import BOLD_COLUMNS, INT_KEYWORDS, PCT_KEYWORDS
+
+# ==========================================
+# 分页视图: 搜索 / 排序在完整结果上执行 (向量化)，只对当前页构造 Styler
+# 完整数据仍用于 KPI 与导出，浏览器只接收一页的样式与数据
+# ==========================================
+
+PAGE_SIZES = [100, 200, 500, 1000]
+GREY_BG = 'background-color: #f0f2f6'
+PROFIT_GRADIENT = dict(cmap='RdYlGn', vmin=-10000, vmax=10000)
+INVENTORY_BARS = [('总库存', '#800080'), ('库存货值', '#2ca02c'), ('滞销库存货值', '#880e4f')]
+
+# 表内搜索: 任一文本列包含关键字 (不区分大小写)，空关键字返回原表
+def search_rows(df, text):
+    text = str(text).strip().upper()
+    if not text or df.empty:
+        return df
+    mask = np.zeros(len(df), dtype=bool)
+    for i in range(len(df.columns)):
+        s = df.iloc[:, i]
+        if pd.api.types.is_numeric_dtype(s): continue
+        mask |= s.astype(str).str.upper().str.contains(text, regex=False).to_numpy(dtype=bool, na_value=False)
+    return df[mask]
+
+# 按列排序 (稳定排序，空值放最后)，col 为 None 时保持原顺序
+def sort_rows(df, col=None, ascending=True):
+    if col is None or col not in df.columns:
+        return df
+    return df.sort_values(col, ascending=ascending, kind='stable', na_position='last')
+
+def page_count(n_rows, page_size):
+    return max(1, math.ceil(n_rows / page_size))
+
+# 取第 page 页 (从 1 开始)
+def page_slice(df, page, page_size):
+    start = (page - 1) * page_size
+    return df.iloc[start:start + page_size]
+
+# 斑马纹分组: 分组列内容变化时切换底色 (在完整视图上计算，翻页后颜色保持连续)
+def zebra_flags(series):
+    codes = series.astype(str)
+    groups = (codes != codes.shift()).cumsum()
+    return (groups % 2 != 0).to_numpy()
+
+def safe_fmt_int(x):
+    try:
+        if pd.isna(x) or x == '': return ""
+        return "{:,.0f}".format(float(x))
+    except: return str(x)
+
+def safe_fmt_pct(x):
+    try:
+        if pd.isna(x) or x == '': return ""
+        return "{:.1%}".format(float(x))
+    except: return str(x)
+
+def get_format_dict(df):
+    format_dict = {}
+    for col in df.columns:
+        c_str = str(col)
+        if any(x in c_str for x in PCT_KEYWORDS):
+            format_dict[col] = safe_fmt_pct
+        elif any(x in c_str for x in INT_KEYWORDS):
+            format_dict[col] = safe_fmt_int
+    return format_dict
+
+def _zebra_styles(x, zebra):
+    styles = pd.DataFrame('', index=x.index, columns=x.columns)
+    styles.loc[zebra, :] = GREY_BG
+    return styles
+
+def _numeric(x, col):
+    return pd.to_numeric(x[col], errors='coerce').fillna(0)
+
+# 利润表 / 业务报表: 加粗列 + 广告费占比 > 50% 标红
+def _report_highlight(x):
+    styles = pd.DataFrame('', index=x.index, columns=x.columns)
+    for col in BOLD_COLUMNS:
+        if col in x.columns: styles[col] = 'font-weight: bold;'
+    if '广告费占比' in x.columns:
+        styles.loc[_numeric(x, '广告费占比') > 0.5, '广告费占比'] += 'color: #d32f2f; font-weight: bold;'
+    return styles
+
+# 库存表: 待补 / 滞销 / 总库存低于安全库存或超过冗余标准
+def _inventory_highlight(x):
+    styles = pd.DataFrame('', index=x.index, columns=x.columns)
+    styles.loc[_numeric(x, '待补数量') > 0, '待补数量'] += 'background-color: #fff3cd; color: #e65100; font-weight: bold;'
+    styles.loc[_numeric(x, '滞销库存货值') > 0, '滞销库存货值'] += 'color: #880e4f; font-weight: bold;'
+    total, safe, redundant = _numeric(x, '总库存'), _numeric(x, '安全库存'), _numeric(x, '冗余标准')
+    active = ~((total == 0) & (redundant == 0))
+    low = active & (total < safe)
+    high = active & ~low & (total >= redundant)
+    styles.loc[low, '总库存'] += 'background-color: #ffcccc; color: #cc0000; font-weight: bold;'
+    styles.loc[high, '总库存'] += 'background-color: #e1bee7; color: #4a148c; font-weight: bold;'
+    return styles
+
+# 利润表 / 业务报表当前页样式 (zebra 为该页对应的斑马纹标记)
+def style_report_page(page_df, zebra, cols_to_color):
+    page_df = page_df.reset_index(drop=True)
+    try:
+        styler = page_df.style.format(get_format_dict(page_df))
+        styler = styler.apply(_zebra_styles, axis=None, zebra=zebra)
+        styler = styler.apply(_report_highlight, axis=None)
+        valid_cols = [c for c in cols_to_color if c in page_df.columns]
+        if valid_cols:
+            styler = styler.background_gradient(subset=valid_cols, **PROFIT_GRADIENT)
+        return styler
+    except: return page_df
+
+# 库存表当前页样式，条形图按完整视图的取值范围缩放 (bar_ranges: 列名 -> (vmin, vmax))
+def style_inventory_page(page_df, zebra, bar_ranges):
+    page_df = page_df.reset_index(drop=True)
+    try:
+        styler = page_df.style.format(get_format_dict(page_df))
+        styler = styler.apply(_zebra_styles, axis=None, zebra=zebra)
+        styler = styler.apply(_inventory_highlight, axis=None)
+        for col, color in INVENTORY_BARS:
+            vmin, vmax = bar_ranges.get(col, (None, None))
+            styler = styler.bar(subset=[col], color=color, vmin=vmin, vmax=vmax)
+        return styler
+    except: return page_df
+
+# 条形图取值范围 (完整视图)
+def bar_ranges(df):
+    ranges = {}
+    for col, _ in INVENTORY_BARS:
+        if col not in df.columns: continue
+        values = pd.to_numeric(df[col], errors='coerce')
+        if values.notna().any():
+            ranges[col] = (float(values.min()), float(values.max()))
+    return ranges